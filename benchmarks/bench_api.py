@@ -0,0 +1,82 @@
+# Latência da API de agregados (src/index.py, rotas /api/<chave>/<parte>) com
+# e sem compressão: a primeira requisição calcula a consulta, as seguintes
+# repetem o ETag recebido em If-None-Match e devem receber 304 sem corpo,
+# também quando o Flask-Compress acrescentou o algoritmo ao ETag
+# ("<hash>:gzip"). Verifica ainda que preços sem volume (divisão por zero)
+# saem como null, e não como Infinity, que não é JSON válido. Falha (código
+# de saída 1) se alguma verificação não passar.
+# Uso: python benchmarks/bench_api.py [linhas] [--repeticoes n]
+import gzip
+import io
+import json
+import os
+import pathlib
+import statistics
+import sys
+import tempfile
+import time
+
+PASTA = pathlib.Path(__file__).parent
+sys.path.insert(0, str(PASTA.joinpath('../src').resolve()))
+# Armazenamento temporário, para não misturar com os datasets reais
+os.environ.setdefault('MADEIRA_CACHE_DIR', tempfile.mkdtemp())
+os.environ.setdefault('MADEIRA_TAREFAS_DIR', tempfile.mkdtemp())
+import gerador  # noqa: E402
+import index  # noqa: E402
+import ingestao  # noqa: E402
+import registro  # noqa: E402
+
+CONSULTAS = ['por=especie&metrica=preco', 'por=periodo,especie&granularidade=mes']
+
+
+def _json_estrito(texto):
+    def recusar(constante):
+        raise ValueError(f'{constante} não é JSON válido')
+    return json.loads(texto, parse_constant=recusar)
+
+
+def cronometrar(cliente, url, cabecalhos, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resposta = cliente.get(url, headers=cabecalhos)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return resposta, statistics.median(tempos)
+
+
+if __name__ == '__main__':
+    argumentos = sys.argv[1:]
+    repeticoes = int(argumentos[argumentos.index('--repeticoes') + 1]) if '--repeticoes' in argumentos else 20
+    linhas = int(argumentos[0]) if argumentos and argumentos[0].isdigit() else 200_000
+    df = gerador.gerar(linhas)
+    # Uma espécie sem volume: preço médio com divisão por zero
+    df.loc[df['MADEIRA_NOME'] == df['MADEIRA_NOME'].iloc[0], 'VOLUME'] = 0.0
+    chave, dataset = ingestao.ler_fluxo(io.BytesIO(df.to_csv(index=False).encode()))
+    registro.registrar(chave, dataset)
+    cliente = index.app.server.test_client()
+
+    falhas = []
+    print(f'{linhas} linhas, mediana de {repeticoes} requisições')
+    for consulta in CONSULTAS:
+        url = f'/api/{chave}/vol?{consulta}'
+        for codificacao in ('identity', 'gzip'):
+            cabecalhos = {'Accept-Encoding': codificacao}
+            completa, completa_ms = cronometrar(cliente, url, cabecalhos, repeticoes)
+            etag = completa.headers.get('ETag')
+            condicional, condicional_ms = cronometrar(cliente, url, dict(cabecalhos, **{'If-None-Match': etag}),
+                                                      repeticoes)
+            comprimida = completa.headers.get('Content-Encoding', 'identity')
+            print(f'{consulta:40s} {codificacao:8s} 200: {completa_ms:7.2f} ms {len(completa.data):9d} bytes '
+                  f'({comprimida})  304: {condicional_ms:6.2f} ms  ETag {etag}')
+            if condicional.status_code != 304:
+                falhas.append(f'{consulta} com {codificacao}: If-None-Match {etag} recebeu {condicional.status_code}')
+            corpo = completa.get_data()
+            if comprimida == 'gzip':
+                corpo = gzip.decompress(corpo)
+            try:
+                _json_estrito(corpo)
+            except ValueError as erro:
+                falhas.append(f'{consulta} com {codificacao}: {erro}')
+    for falha in falhas:
+        print('FALHA:', falha)
+    sys.exit(1 if falhas else 0)
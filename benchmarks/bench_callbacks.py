@@ -0,0 +1,144 @@
+# Mede, para CSVs sintéticos de tamanhos crescentes (benchmarks/gerador.py),
+# o tempo e o pico de memória da importação e de cada callback de servidor,
+# além do tamanho do JSON que cada callback devolve ao navegador.
+# O cache de figuras é desativado para que toda chamada refaça os cálculos.
+# Uso: python benchmarks/bench_callbacks.py [linhas ...] [--saida resultados.json]
+# (padrão: 10000 100000 1000000 10000000)
+import json
+import os
+import pathlib
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import plotly.io.json
+
+PASTA = pathlib.Path(__file__).parent
+sys.path.insert(0, str(PASTA.joinpath('../src').resolve()))
+TEMP = tempfile.mkdtemp(prefix='bench-madeira-')
+os.environ['MADEIRA_CACHE_FIGURAS'] = '0'
+os.environ.setdefault('MADEIRA_CACHE_DIR', os.path.join(TEMP, 'cache'))
+
+import agregados  # noqa: E402
+import gerador  # noqa: E402
+import index  # noqa: E402
+import ingestao  # noqa: E402
+import registro  # noqa: E402
+from apps import area_vendida, preco_area, preco_volume, volume_vendido  # noqa: E402
+
+TAMANHOS = [10_000, 100_000, 1_000_000, 10_000_000]
+REPETICOES = 5
+
+
+def _clique(nome, indice=0):
+    return {'points': [{'pointIndex': indice, 'x': nome}]}
+
+
+# Chamadas de cada callback de servidor, como o navegador faria após importar
+# o arquivo: (nome, função, argumentos)
+def chamadas(dataset, stored_data):
+    cubo_vol, cubo_area = dataset['cubo_vol'], dataset['cubo_area']
+    apresentacao_vol = cubo_vol['APRESENTACAO_NOME'].cat.categories[0]
+    especie_vol = cubo_vol['MADEIRA_NOME'].cat.categories[0]
+    apresentacao_area = cubo_area['APRESENTACAO_NOME'].cat.categories[0]
+    especie_area = cubo_area['MADEIRA_NOME'].cat.categories[0]
+    lista = [
+        ('index.display_page', index.display_page, ['/apps/volume_vendido']),
+    ]
+    for modulo, apresentacao, especie in [(volume_vendido, apresentacao_vol, especie_vol),
+                                          (area_vendida, apresentacao_area, especie_area)]:
+        nome = modulo.__name__
+        lista += [
+            (f'{nome}.display_warning_message', modulo.display_warning_message, [stored_data]),
+            (f'{nome}.update_bar_chart_pai[apresentacao]', modulo.update_bar_chart_pai,
+             ['apresentacao', 0, 1, stored_data]),
+            (f'{nome}.update_bar_chart_pai[especie]', modulo.update_bar_chart_pai, ['especie', 0, 1, stored_data]),
+            (f'{nome}.update_bar_chart_pai[especie,top20,p2]', modulo.update_bar_chart_pai,
+             ['especie', 20, 2, stored_data]),
+            (f'{nome}.update_bar_chart_filho', modulo.update_bar_chart_filho,
+             [_clique(apresentacao), 'apresentacao', 0, stored_data]),
+            (f'{nome}.update_pie_chart', modulo.update_pie_chart,
+             [_clique(apresentacao), _clique(especie), 'apresentacao', stored_data]),
+        ]
+    for modulo, especie in [(preco_volume, especie_vol), (preco_area, especie_area)]:
+        nome = modulo.__name__
+        lista += [
+            (f'{nome}.update_dropdown', modulo.update_dropdown, ['apresentacao', stored_data]),
+        ]
+        lista += [
+            (f'{nome}.update_bar_chart[{estimador}]', modulo.update_bar_chart,
+             [0, 'apresentacao', estimador, stored_data])
+            for estimador in agregados.ESTIMADORES
+        ]
+        lista += [
+            (f'{nome}.update_line_chart[{granularidade}]', modulo.update_line_chart,
+             [_clique(especie), 0, 'apresentacao', granularidade, stored_data])
+            for granularidade in ['dia', 'mes', 'trimestre', 'ano']
+        ]
+    return lista
+
+
+def _payload(resultado):
+    return len(plotly.io.json.to_json_plotly(resultado).encode())
+
+
+# Tempo (mediana de `repeticoes` execuções, sem tracemalloc, que deixa as
+# alocações mais lentas) e pico de memória (uma execução rastreada)
+def medir(funcao, *args, repeticoes=REPETICOES):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao(*args)
+        tempos.append(time.perf_counter() - inicio)
+    tracemalloc.start()
+    funcao(*args)
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(tempos), pico, resultado
+
+
+def medir_tamanho(linhas):
+    caminho = gerador.gerar_csv(linhas, os.path.join(TEMP, f'nfe_{linhas}.csv'))
+    resultados = {'linhas': linhas, 'csv_bytes': os.path.getsize(caminho), 'callbacks': {}}
+
+    def importar():
+        with open(caminho, 'rb') as arquivo:
+            return ingestao.ler_csv(arquivo)
+
+    # A importação é cara demais para repetir nos tamanhos maiores
+    tempo, pico, dataset = medir(importar, repeticoes=1)
+    resultados['importacao'] = {'segundos': tempo, 'pico_bytes': pico}
+    stored_data = registro.registrar(f'{linhas:064x}', dataset)
+    os.remove(caminho)
+
+    for nome, funcao, args in chamadas(dataset, stored_data):
+        tempo, pico, resultado = medir(funcao, *args)
+        resultados['callbacks'][nome] = {'segundos': tempo, 'pico_bytes': pico, 'payload_bytes': _payload(resultado)}
+    return resultados
+
+
+def imprimir(resultados):
+    importacao = resultados['importacao']
+    print(f"\n{resultados['linhas']} linhas ({resultados['csv_bytes'] / 2**20:.1f} MiB de CSV)")
+    print(f"{'importação':60s} {importacao['segundos'] * 1000:10.1f} ms {importacao['pico_bytes'] / 2**20:9.1f} MiB")
+    for nome, medida in resultados['callbacks'].items():
+        print(f"{nome:60s} {medida['segundos'] * 1000:10.1f} ms {medida['pico_bytes'] / 2**20:9.1f} MiB "
+              f"{medida['payload_bytes'] / 1024:9.1f} KiB")
+
+
+if __name__ == '__main__':
+    argumentos = sys.argv[1:]
+    saida = None
+    if '--saida' in argumentos:
+        posicao = argumentos.index('--saida')
+        saida = argumentos[posicao + 1]
+        del argumentos[posicao:posicao + 2]
+    todos = []
+    for linhas in [int(valor) for valor in argumentos] or TAMANHOS:
+        todos.append(medir_tamanho(linhas))
+        imprimir(todos[-1])
+    if saida:
+        with open(saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(todos, arquivo, indent=2)
@@ -0,0 +1,59 @@
+# Vazão (linhas/s) da importação pela rota POST /importar/csv, com o CSV puro
+# e comprimido com gzip no corpo da requisição, comparada à importação pelo
+# dcc.Upload (conteúdo em base64 gravado decodificado por
+# ingestao.guardar_upload e lido por ingestao.ler_envio, como na tarefa de
+# update_output). O tempo da rota inclui a gravação do dataset no
+# armazenamento.
+# Uso: python benchmarks/bench_importacao.py [linhas]
+import base64
+import gzip
+import os
+import pathlib
+import sys
+import tempfile
+import time
+
+PASTA = pathlib.Path(__file__).parent
+sys.path.insert(0, str(PASTA.joinpath('../src').resolve()))
+# Armazenamento temporário, para não misturar com os datasets reais
+os.environ.setdefault('MADEIRA_CACHE_DIR', tempfile.mkdtemp())
+os.environ.setdefault('MADEIRA_TAREFAS_DIR', tempfile.mkdtemp())
+os.environ.setdefault('MADEIRA_TOKEN_IMPORTACAO', 'benchmark')
+import gerador  # noqa: E402
+import index  # noqa: E402
+import ingestao  # noqa: E402
+
+
+def cronometrar(funcao):
+    inicio = time.perf_counter()
+    funcao()
+    return time.perf_counter() - inicio
+
+
+if __name__ == '__main__':
+    linhas = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    conteudo = gerador.gerar(linhas).to_csv(index=False).encode()
+    comprimido = gzip.compress(conteudo, compresslevel=6)
+    upload = 'data:text/csv;base64,' + base64.b64encode(conteudo).decode()
+    cliente = index.app.server.test_client()
+
+    def importar_upload():
+        envio = ingestao.guardar_upload(upload)
+        try:
+            ingestao.ler_envio(envio)
+        finally:
+            ingestao.remover_envio(envio)
+
+    def postar(corpo):
+        resposta = cliente.post('/importar/csv', data=corpo, content_type='text/csv',
+                                headers={'Authorization': f'Bearer {os.environ["MADEIRA_TOKEN_IMPORTACAO"]}'})
+        assert resposta.status_code == 200, resposta.get_json()
+
+    print(f'{linhas} linhas')
+    for nome, tamanho, funcao in [
+        ('dcc.Upload (base64)', len(upload), importar_upload),
+        ('POST csv', len(conteudo), lambda: postar(conteudo)),
+        ('POST csv.gz', len(comprimido), lambda: postar(comprimido)),
+    ]:
+        segundos = cronometrar(funcao)
+        print(f'{nome:22s} {tamanho / 2**20:8.1f} MiB enviados {segundos:7.2f} s {linhas / segundos:10.0f} linhas/s')
@@ -0,0 +1,52 @@
+# Compara o parse antigo (apply linha a linha) das colunas NUMEROS e
+# PROFUNDIDADE com o parse vetorizado de src/ingestao.py.
+# Uso: python benchmarks/bench_ingestao.py [linhas]
+import pathlib
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.joinpath('../src').resolve()))
+import ingestao  # noqa: E402
+
+
+def gerar_colunas(linhas, seed=0):
+    rng = np.random.default_rng(seed)
+    a, b, c = (pd.Series(rng.integers(1, 30, linhas)).astype(str) for _ in range(3))
+    tres = rng.random(linhas) < 0.5
+    numeros = np.where(tres, '[' + a + '.0, ' + b + '.0, ' + c + '.0]', '[' + a + '.0, ' + b + '.0]')
+    profundidade = np.where(rng.random(linhas) < 0.2, '[' + c + '.0]', '[]')
+    return pd.DataFrame({'NUMEROS': numeros, 'PROFUNDIDADE': profundidade})
+
+
+def parse_antigo(df):
+    df = df.copy()
+    df['NUMEROS'] = df['NUMEROS'].apply(lambda x: [float(num) for num in x.strip('[]').split(',')])
+    df['PROFUNDIDADE'] = df['PROFUNDIDADE'].apply(lambda x: [float(num) for num in str(x).strip('[]').split(',') if num.strip()])
+    df_vol = df[(df['NUMEROS'].str.len() > 2) | (df['PROFUNDIDADE'].str.len() > 0)]
+    df_area = df[(df['NUMEROS'].str.len() <= 2) & (df['PROFUNDIDADE'].str.len() <= 0)]
+    return df_vol, df_area
+
+
+def parse_vetorizado(df):
+    return ingestao.separar_vol_area(ingestao.parse_numeros(df))
+
+
+def cronometrar(funcao, df):
+    inicio = time.perf_counter()
+    resultado = funcao(df)
+    return time.perf_counter() - inicio, resultado
+
+
+if __name__ == '__main__':
+    linhas = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    df = gerar_colunas(linhas)
+    t_antigo, (vol_antigo, area_antigo) = cronometrar(parse_antigo, df)
+    t_novo, (vol_novo, area_novo) = cronometrar(parse_vetorizado, df)
+    assert len(vol_antigo) == len(vol_novo) and len(area_antigo) == len(area_novo)
+    print(f'{linhas} linhas')
+    print(f'apply:      {t_antigo:8.3f} s')
+    print(f'vetorizado: {t_novo:8.3f} s')
+    print(f'speedup:    {t_antigo / t_novo:8.1f}x')
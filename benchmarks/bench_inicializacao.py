@@ -0,0 +1,81 @@
+# Tempo de inicialização do servidor (import de src/index.py, que registra as
+# páginas e todos os callbacks) medido em processos novos, comparado ao import
+# do Dash puro. Falha (código de saída 1) se o acréscimo do app sobre o Dash
+# passar do orçamento ou se alguma biblioteca pesada for importada já na
+# inicialização em vez de sob demanda (src/sob_demanda.py). Mede também o
+# custo que fica para a primeira navegação. A pasta do dataset padrão
+# (src/padrao.py) é uma pasta vazia: aqui se mede o servidor sem pré-carga.
+# Uso: python benchmarks/bench_inicializacao.py [--orcamento ms] [--repeticoes n]
+import json
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+
+SRC = pathlib.Path(__file__).parent.joinpath('../src').resolve()
+# Acréscimo máximo (ms) do import do app sobre o import do Dash, Flask e diskcache
+ORCAMENTO_MS = 250
+# Bibliotecas que devem ficar para o primeiro uso
+PESADAS = ['numpy', 'pandas', 'pyarrow', 'plotly.express', 'xlsxwriter', 'classificacao', 'medidas']
+
+MEDIR = """
+import json, sys, time
+inicio = time.perf_counter()
+import {modulos}
+resultado = {{'import_ms': (time.perf_counter() - inicio) * 1000,
+              'carregadas': [nome for nome in {pesadas!r} if nome in sys.modules]}}
+if {navegar}:
+    inicio = time.perf_counter()
+    index.display_page('/apps/preco_volume')
+    index.preco_volume.update_dropdown('apresentacao', None)
+    resultado['navegacao_ms'] = (time.perf_counter() - inicio) * 1000
+print(json.dumps(resultado))
+"""
+
+
+def medir(modulos, navegar=False):
+    codigo = MEDIR.format(modulos=modulos, pesadas=PESADAS, navegar=navegar)
+    with tempfile.TemporaryDirectory() as pasta:
+        saida = subprocess.run([sys.executable, '-c', codigo], cwd=SRC, capture_output=True, text=True, check=True,
+                               env=dict(os.environ, MADEIRA_DATASETS_DIR=pasta))
+    return json.loads(saida.stdout.splitlines()[-1])
+
+
+# Módulos com maior tempo próprio de import, pela saída de python -X importtime
+def maiores_imports(quantidade=10):
+    with tempfile.TemporaryDirectory() as pasta:
+        saida = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import index'],
+                               cwd=SRC, capture_output=True, text=True, check=True,
+                               env=dict(os.environ, MADEIRA_DATASETS_DIR=pasta))
+    tempos = []
+    for linha in saida.stderr.splitlines()[1:]:
+        proprio, _, nome = linha.removeprefix('import time:').split('|')
+        tempos.append((int(proprio), nome.strip()))
+    return sorted(tempos, reverse=True)[:quantidade]
+
+
+if __name__ == '__main__':
+    argumentos = sys.argv[1:]
+    orcamento = float(argumentos[argumentos.index('--orcamento') + 1]) if '--orcamento' in argumentos else ORCAMENTO_MS
+    repeticoes = int(argumentos[argumentos.index('--repeticoes') + 1]) if '--repeticoes' in argumentos else 5
+    base = statistics.median(medir('dash, flask, diskcache')['import_ms'] for _ in range(repeticoes))
+    medidas = [medir('index', navegar=True) for _ in range(repeticoes)]
+    app = statistics.median(medida['import_ms'] for medida in medidas)
+    navegacao = statistics.median(medida['navegacao_ms'] for medida in medidas)
+    carregadas = medidas[0]['carregadas']
+    print(f'import do Dash/Flask:      {base:7.0f} ms')
+    print(f'import do app (index.py):  {app:7.0f} ms (+{app - base:.0f} ms, orçamento +{orcamento:.0f} ms)')
+    print(f'primeira navegação:        {navegacao:7.0f} ms')
+    print('maiores imports (tempo próprio):')
+    for microssegundos, nome in maiores_imports():
+        print(f'  {microssegundos / 1000:7.1f} ms  {nome}')
+    falhas = []
+    if app - base > orcamento:
+        falhas.append(f'inicialização {app - base:.0f} ms acima do Dash, orçamento {orcamento:.0f} ms')
+    if carregadas:
+        falhas.append(f'importadas na inicialização: {", ".join(carregadas)}')
+    for falha in falhas:
+        print('FALHA:', falha)
+    sys.exit(1 if falhas else 0)
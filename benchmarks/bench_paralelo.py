@@ -0,0 +1,37 @@
+# Mede a escalabilidade da importação de descrições brutas (classificação e
+# cálculo do volume em src/ingestao.py) com 1, 2, 4 e 8 processos, e confere
+# que o dataset gerado é idêntico ao da importação em um único processo.
+# Uso: python benchmarks/bench_paralelo.py [linhas]
+import io
+import pathlib
+import sys
+import time
+
+PASTA = pathlib.Path(__file__).parent
+sys.path.insert(0, str(PASTA.joinpath('../src').resolve()))
+import gerador  # noqa: E402
+import classificacao  # noqa: E402
+import ingestao  # noqa: E402
+
+PROCESSOS = [1, 2, 4, 8]
+
+
+def importar(conteudo, processos):
+    # Sem o cache herdado de execuções anteriores, todas começam do zero
+    classificacao.classificar.cache_clear()
+    inicio = time.perf_counter()
+    dataset = ingestao.ler_csv(io.BytesIO(conteudo), processos=processos)
+    return time.perf_counter() - inicio, dataset
+
+
+if __name__ == '__main__':
+    linhas = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    conteudo = gerador.gerar(linhas, bruto=True).to_csv(index=False).encode()
+    print(f'{linhas} linhas, {ingestao.LINHAS_POR_BLOCO} por bloco, {ingestao.PROCESSOS} núcleos disponíveis')
+    t_serial, referencia = importar(conteudo, 1)
+    print(f'{1:2d} processo(s): {t_serial:8.3f} s')
+    for processos in PROCESSOS[1:]:
+        tempo, dataset = importar(conteudo, processos)
+        assert all(dataset[nome].equals(referencia[nome]) for nome in referencia)
+        print(f'{processos:2d} processo(s): {tempo:8.3f} s ({t_serial / tempo:.2f}x, eficiência '
+              f'{t_serial / tempo / min(processos, ingestao.PROCESSOS):.0%})')
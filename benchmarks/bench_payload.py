@@ -0,0 +1,96 @@
+# Compara, para cada figura devolvida pelos callbacks, o JSON com listas de
+# números e o JSON com arrays tipados (src/serializacao.py): bytes sem
+# compressão, bytes com gzip (como o Flask-Compress envia) e o tempo de
+# decodificação no navegador, medido no Node.js com JSON.parse mais a
+# conversão do base64 em Float64Array/Int32Array, como faz o plotly.js.
+# Com --digitos n, mede também o limite de precisão de n dígitos significativos.
+# Uso: python benchmarks/bench_payload.py [linhas] [--digitos n]
+import gzip
+import io
+import json
+import pathlib
+import subprocess
+import sys
+import tempfile
+
+import plotly.io.json
+
+import bench_callbacks
+import gerador
+import ingestao
+import registro
+import serializacao
+
+REPETICOES = 200
+
+DECODIFICAR_JS = """
+const fs = require('fs');
+const [arquivo, repeticoes] = [process.argv[1], Number(process.argv[2])];
+const TIPOS = {f8: Float64Array, f4: Float32Array, i1: Int8Array, i2: Int16Array, i4: Int32Array};
+function tipados(valor) {
+    if (valor && typeof valor === 'object') {
+        if (valor.bdata !== undefined) {
+            // Cópia para um ArrayBuffer próprio, alinhado ao tamanho do tipo
+            return new TIPOS[valor.dtype](new Uint8Array(Buffer.from(valor.bdata, 'base64')).buffer);
+        }
+        for (const chave in valor) valor[chave] = tipados(valor[chave]);
+    }
+    return valor;
+}
+const resultados = {};
+for (const [nome, texto] of Object.entries(JSON.parse(fs.readFileSync(arquivo, 'utf8')))) {
+    const inicio = process.hrtime.bigint();
+    for (let i = 0; i < repeticoes; i++) tipados(JSON.parse(texto));
+    resultados[nome] = Number(process.hrtime.bigint() - inicio) / 1e6 / repeticoes;
+}
+console.log(JSON.stringify(resultados));
+"""
+
+
+def decodificar_no_node(textos):
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = pathlib.Path(pasta, 'figuras.json')
+        caminho.write_text(json.dumps(textos))
+        saida = subprocess.run(['node', '-e', DECODIFICAR_JS, str(caminho), str(REPETICOES)],
+                               capture_output=True, text=True, check=True)
+    return json.loads(saida.stdout)
+
+
+def imprimir(nome, medidas):
+    print(f'{nome:52s}' + ' -> '.join(f'{b:7d} {g:6d} {t:6.3f}' for b, g, t in medidas))
+
+
+if __name__ == '__main__':
+    argumentos = sys.argv[1:]
+    digitos = None
+    if '--digitos' in argumentos:
+        posicao = argumentos.index('--digitos')
+        digitos = int(argumentos[posicao + 1])
+        del argumentos[posicao:posicao + 2]
+    linhas = int(argumentos[0]) if argumentos else 1_000_000
+    formatos = ['listas', 'tipados'] + (['digitos'] if digitos else [])
+    dataset = ingestao.ler_csv(io.BytesIO(gerador.gerar(linhas).to_csv(index=False).encode()))
+    stored_data = registro.registrar(f'{linhas:064x}', dataset)
+    textos = {}
+    for nome, funcao, args in bench_callbacks.chamadas(dataset, stored_data):
+        figura = funcao(*args)
+        if isinstance(figura, dict) and figura.get('data'):
+            textos[f'{nome}|listas'] = plotly.io.json.to_json_plotly(serializacao.expandir(figura))
+            textos[f'{nome}|tipados'] = plotly.io.json.to_json_plotly(figura)
+            if digitos:
+                serializacao.DIGITOS = digitos
+                textos[f'{nome}|digitos'] = plotly.io.json.to_json_plotly(
+                    serializacao.compactar(serializacao.expandir(figura)))
+                serializacao.DIGITOS = None
+    tempos = decodificar_no_node(textos)
+    print(f'{linhas} linhas; bytes JSON, bytes gzip e decodificação (ms): ' + ' -> '.join(
+        formato if formato != 'digitos' else f'{digitos} dígitos' for formato in formatos))
+    total = {formato: [0, 0, 0.0] for formato in formatos}
+    for nome in dict.fromkeys(chave.split('|')[0] for chave in textos):
+        medidas = []
+        for formato in formatos:
+            texto = textos[f'{nome}|{formato}'].encode()
+            medidas.append((len(texto), len(gzip.compress(texto)), tempos[f'{nome}|{formato}']))
+            total[formato] = [soma + valor for soma, valor in zip(total[formato], medidas[-1])]
+        imprimir(nome, medidas)
+    imprimir('total', [total[formato] for formato in formatos])
@@ -0,0 +1,53 @@
+# Conta quantos callbacks executados no servidor (requisições HTTP) e quantos
+# executados no navegador (clientside) cada interação do usuário dispara,
+# seguindo a cadeia de callbacks cujas entradas são saídas de outros callbacks.
+# Uso: python benchmarks/bench_requisicoes.py
+import pathlib
+import sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.joinpath('../src').resolve()))
+import index  # noqa: E402,F401
+from app import app  # noqa: E402
+
+# Interações do usuário: (descrição, propriedade alterada)
+INTERACOES = [
+    ('navegar entre páginas', 'url.pathname'),
+    ('importar CSV', 'upload-data.contents'),
+    ('trocar rádio (volume vendido)', 'radio-selection-vol-vendido.value'),
+    ('clicar barra (volume vendido)', 'bar-pai-vol.clickData'),
+    ('clicar barra filha (volume vendido)', 'bar-chart-vol-vendido.clickData'),
+    ('trocar rádio (preço volume)', 'radio-selection-vol.value'),
+    ('selecionar dropdown (preço volume)', 'dropdown-vol.value'),
+    ('clicar barra (preço volume)', 'bar-preco-vol.clickData'),
+]
+
+
+def _saidas(callback):
+    return [saida.split('@')[0] for saida in callback['output'].strip('.').split('...')]
+
+
+def contar(propriedade):
+    alteradas, executados = {propriedade}, set()
+    servidor = clientside = 0
+    mudou = True
+    while mudou:
+        mudou = False
+        for indice, callback in enumerate(app._callback_list):
+            entradas = {f"{entrada['id']}.{entrada['property']}" for entrada in callback['inputs']}
+            if indice in executados or not entradas & alteradas:
+                continue
+            executados.add(indice)
+            mudou = True
+            if callback['clientside_function']:
+                clientside += 1
+            else:
+                servidor += 1
+            alteradas.update(_saidas(callback))
+    return servidor, clientside
+
+
+if __name__ == '__main__':
+    print(f"{'interação':40} {'servidor':>9} {'navegador':>10}")
+    for descricao, propriedade in INTERACOES:
+        servidor, clientside = contar(propriedade)
+        print(f'{descricao:40} {servidor:9d} {clientside:10d}')
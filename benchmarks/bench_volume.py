@@ -0,0 +1,57 @@
+# Compara o cálculo do VOLUME linha a linha (laço em Python) com o cálculo
+# vetorizado de src/medidas.py, sobre as medidas de um CSV sintético.
+# Uso: python benchmarks/bench_volume.py [linhas]
+import pathlib
+import sys
+import time
+
+import numpy as np
+
+PASTA = pathlib.Path(__file__).parent
+sys.path.insert(0, str(PASTA.joinpath('../src').resolve()))
+import gerador  # noqa: E402
+import ingestao  # noqa: E402
+import medidas  # noqa: E402
+
+
+def volume_laco(numeros, profundidades):
+    faixas = list(medidas.NBR_14807.itertuples())
+    volumes = []
+    for numeros_linha, profundidade in zip(numeros, profundidades):
+        if len(numeros_linha) < 2:
+            volumes.append(np.nan)
+            continue
+        medidas_cm = list(numeros_linha[:2])
+        if len(numeros_linha) > 2:
+            medidas_cm.append(numeros_linha[2] * 100)
+        elif profundidade:
+            medidas_cm.append(profundidade[0] * 100)
+        medidas_cm.sort()
+        espessura, largura = medidas_cm[:2]
+        if not any(f.ESPESSURA_MIN <= espessura <= f.ESPESSURA_MAX and f.LARGURA_MIN <= largura <= f.LARGURA_MAX
+                   for f in faixas):
+            volumes.append(np.nan)
+        elif len(medidas_cm) == 3:
+            volumes.append(espessura * largura * medidas_cm[2] / 1_000_000)
+        else:
+            volumes.append(espessura * largura / 10_000)
+    return np.array(volumes)
+
+
+def cronometrar(funcao, *args):
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    return time.perf_counter() - inicio, resultado
+
+
+if __name__ == '__main__':
+    linhas = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    df = gerador.gerar(linhas).drop(columns='VOLUME')
+    numeros = [[float(num) for num in x.strip('[]').split(',')] for x in df['NUMEROS']]
+    profundidades = [[float(num) for num in x.strip('[]').split(',') if num.strip()] for x in df['PROFUNDIDADE']]
+    t_laco, volume_antigo = cronometrar(volume_laco, numeros, profundidades)
+    t_novo, resultado = cronometrar(medidas.calcular_volume, ingestao.parse_numeros(df))
+    assert np.allclose(volume_antigo, resultado['VOLUME'], equal_nan=True)
+    print(f'{linhas} linhas')
+    print(f'laço:       {t_laco:8.3f} s')
+    print(f'vetorizado: {t_novo:8.3f} s ({t_laco / t_novo:.1f}x)')
@@ -0,0 +1,93 @@
+# Gerador de CSVs sintéticos de NF-e de madeira no formato esperado por
+# index.update_output: SK_DATA, NUMEROS, PROFUNDIDADE, VOLUME,
+# VL_UNIT_COMERCIAL, MADEIRA_NOME, APRESENTACAO_NOME e COD_MODELO.
+# Uso: python benchmarks/gerador.py <linhas> <arquivo.csv> [--bruto]
+import sys
+
+import numpy as np
+import pandas as pd
+
+ESPECIES = ['angelim', 'maçaranduba', 'cumaru', 'ipê', 'jatobá', 'cedrinho', 'garapeira', 'tatajuba',
+            'cupiúba', 'itaúba', 'sucupira', 'louro', 'freijó', 'muiracatiara', 'tauari', 'pequiá',
+            'andiroba', 'amescla', 'cambará', 'eucalipto', 'pinus', 'peroba', 'roxinho', 'cedro']
+APRESENTACOES = ['linha', 'tábua', 'viga', 'caibro', 'ripa', 'pranchão', 'sarrafo', 'barrote',
+                 'deck', 'assoalho', 'forro', 'rodapé', 'batente', 'pontalete', 'prancha', 'mourão']
+# Modelos de documento fiscal: NF-e (55) e NFC-e (65)
+MODELOS = [55, 65]
+LINHAS_POR_BLOCO = 1_000_000
+
+
+def _nomes(base, quantidade):
+    # Completa a lista com variantes numeradas até a cardinalidade desejada
+    return np.array(base + [f'{nome} {i}' for i in range(2, quantidade) for nome in base][:quantidade - len(base)])
+
+
+ESPECIES_TODAS = _nomes(ESPECIES, 150)
+APRESENTACOES_TODAS = _nomes(APRESENTACOES, 24)
+
+
+ESPESSURAS = np.array([1.0, 2.0, 2.5, 3.0, 4.0, 5.0, 6.0, 8.0])
+LARGURAS = np.array([5.0, 7.0, 10.0, 11.0, 12.0, 15.0, 20.0, 25.0, 30.0])
+COMPRIMENTOS = np.array([2.0, 2.5, 3.0, 3.5, 4.0, 5.0, 6.0])
+
+
+def _lista(*valores):
+    return '[' + ', '.join(str(valor) for valor in valores) + ']'
+
+
+# Textos de NUMEROS/PROFUNDIDADE pré-montados para cada combinação de medidas,
+# indexados por (espessura, largura, comprimento)
+_DUAS = np.array([[_lista(e, l) for l in LARGURAS] for e in ESPESSURAS])
+_TRES = np.array([[[_lista(e, l, c) for c in COMPRIMENTOS] for l in LARGURAS] for e in ESPESSURAS])
+_PROFUNDIDADES = np.array([_lista(c) for c in COMPRIMENTOS])
+_DUAS_DESCRICAO = np.array([[f'{e:g}x{l:g}cm' for l in LARGURAS] for e in ESPESSURAS])
+_TRES_DESCRICAO = np.array([[[f'{e:g}x{l:g}x{c:g}' for c in COMPRIMENTOS] for l in LARGURAS] for e in ESPESSURAS])
+
+
+# Gera `linhas` notas sintéticas. Espécies e apresentações seguem uma
+# distribuição de Zipf (poucos nomes concentram a maior parte das vendas);
+# cerca de 60% das descrições têm três dimensões (volume) e 40% duas (área),
+# e 5% trazem profundidade.
+# Com `bruto=True`, gera as descrições dos produtos (coluna DESCRICAO) no
+# lugar de MADEIRA_NOME, APRESENTACAO_NOME e VOLUME, que a importação deriva.
+def gerar(linhas, seed=0, bruto=False):
+    rng = np.random.default_rng(seed)
+    e = rng.integers(0, len(ESPESSURAS), linhas)
+    l = rng.integers(0, len(LARGURAS), linhas)
+    c = rng.integers(0, len(COMPRIMENTOS), linhas)
+    tres_numeros = rng.random(linhas) < 0.6
+    numeros = np.where(tres_numeros, _TRES[e, l, c], _DUAS[e, l])
+    tem_profundidade = rng.random(linhas) < 0.05
+    profundidade = np.where(tem_profundidade, _PROFUNDIDADES[c], '[]')
+    volume = ESPESSURAS[e] * LARGURAS[l] / 10_000 * np.where(tres_numeros | tem_profundidade, COMPRIMENTOS[c], 1.0)
+    datas = pd.Timestamp('2019-01-01') + pd.to_timedelta(rng.integers(0, 5 * 365, linhas), unit='D')
+    especie = (rng.zipf(1.3, linhas) - 1) % len(ESPECIES_TODAS)
+    apresentacao = (rng.zipf(1.6, linhas) - 1) % len(APRESENTACOES_TODAS)
+    df = pd.DataFrame({
+        'SK_DATA': datas.year * 10_000 + datas.month * 100 + datas.day,
+        'NUMEROS': numeros.astype(object),
+        'PROFUNDIDADE': profundidade.astype(object),
+        'VOLUME': volume.round(6),
+        'VL_UNIT_COMERCIAL': (volume * rng.lognormal(np.log(2500), 0.4, linhas)).round(2),
+        'MADEIRA_NOME': ESPECIES_TODAS[especie],
+        'APRESENTACAO_NOME': APRESENTACOES_TODAS[apresentacao],
+        'COD_MODELO': rng.choice(MODELOS, linhas, p=[0.7, 0.3]),
+    })
+    if bruto:
+        medidas = pd.Series(np.where(tres_numeros, _TRES_DESCRICAO[e, l, c], _DUAS_DESCRICAO[e, l]))
+        df['DESCRICAO'] = df['MADEIRA_NOME'] + ' ' + df['APRESENTACAO_NOME'] + ' ' + medidas
+        df = df.drop(columns=['MADEIRA_NOME', 'APRESENTACAO_NOME', 'VOLUME'])
+    return df
+
+
+# Grava o CSV em blocos, para gerar arquivos grandes com memória limitada
+def gerar_csv(linhas, caminho, seed=0, bruto=False):
+    with open(caminho, 'w', encoding='utf-8', newline='') as arquivo:
+        for bloco, inicio in enumerate(range(0, linhas, LINHAS_POR_BLOCO)):
+            df = gerar(min(LINHAS_POR_BLOCO, linhas - inicio), seed + bloco, bruto)
+            df.to_csv(arquivo, index=False, header=bloco == 0)
+    return caminho
+
+
+if __name__ == '__main__':
+    gerar_csv(int(sys.argv[1]), sys.argv[2], bruto='--bruto' in sys.argv[3:])
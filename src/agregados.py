@@ -0,0 +1,309 @@
+import sob_demanda
+
+np = sob_demanda.importar('numpy')
+pd = sob_demanda.importar('pandas')
+
+# Cubo de agregação calculado uma única vez na importação: somas de VOLUME e
+# VL_UNIT_COMERCIAL e quantidade de linhas para cada combinação de espécie,
+# apresentação, ano/mês e modelo do documento. Os callbacks consultam o cubo
+# em vez de percorrer todas as linhas do dataset a cada interação.
+DIMENSOES = ['MADEIRA_NOME', 'APRESENTACAO_NOME', 'ANO_MES', 'COD_MODELO']
+METRICAS = ['VOLUME', 'VL_UNIT_COMERCIAL', 'LINHAS']
+
+
+# MADEIRA_NOME e APRESENTACAO_NOME chegam como categóricas; apenas as
+# combinações observadas entram no cubo
+def construir_cubo(df):
+    agrupado = df.assign(ANO_MES=df['SK_DATA'] // 100, LINHAS=1)
+    return agrupado.groupby(DIMENSOES, sort=False, dropna=False, observed=True)[METRICAS].sum().reset_index()
+
+
+# Une cubos de partes do dataset (blocos da importação) em um único cubo
+def combinar_cubos(cubos):
+    cubo = pd.concat(cubos, ignore_index=True)
+    return cubo.groupby(DIMENSOES, sort=False, dropna=False, observed=True)[METRICAS].sum().reset_index()
+
+
+# Máscara das linhas cuja coluna categórica tem o código informado
+def mascara_codigo(coluna, codigo):
+    return (coluna.cat.codes == codigo).to_numpy()
+
+
+# Máscara das linhas cuja coluna categórica tem o nome informado (ex.: rótulo
+# clicado em um gráfico); o nome é convertido em código uma única vez
+def mascara_nome(coluna, nome):
+    codigo = coluna.cat.categories.get_indexer([nome])[0]
+    if codigo < 0:
+        return np.zeros(len(coluna), dtype=bool)
+    return mascara_codigo(coluna, codigo)
+
+
+# Granularidades da série temporal de preço: valor do seletor -> rótulo do eixo x
+GRANULARIDADES = {'dia': 'Dia', 'mes': 'Ano/Mês', 'trimestre': 'Ano/Trimestre', 'ano': 'Ano'}
+
+
+# Chave inteira do período de cada linha. A granularidade diária usa SK_DATA
+# (AAAAMMDD) das linhas do dataset; as demais podem usar ANO_MES do cubo.
+def _chave_periodo(dados, granularidade):
+    if granularidade == 'dia':
+        return dados['SK_DATA']
+    ano_mes = dados['ANO_MES'] if 'ANO_MES' in dados else dados['SK_DATA'] // 100
+    if granularidade == 'mes':
+        return ano_mes
+    if granularidade == 'trimestre':
+        return (ano_mes // 100) * 10 + (ano_mes % 100 - 1) // 3 + 1
+    if granularidade == 'ano':
+        return ano_mes // 100
+    raise ValueError(f'Granularidade inválida: {granularidade}')
+
+
+def _rotulo_periodo(chave, granularidade):
+    if granularidade == 'dia':
+        return f'{chave // 10000}/{chave // 100 % 100:02d}/{chave % 100:02d}'
+    if granularidade == 'mes':
+        return f'{chave // 100}/{chave % 100}'
+    if granularidade == 'trimestre':
+        return f'{chave // 10}/T{chave % 10}'
+    return str(chave)
+
+
+# Série de preço médio (soma de VL_UNIT_COMERCIAL / soma de VOLUME) por período,
+# calculada em um único agrupamento e em ordem cronológica
+def serie_preco(dados, granularidade='mes'):
+    somas = dados.groupby(_chave_periodo(dados, granularidade))[['VL_UNIT_COMERCIAL', 'VOLUME']].sum()
+    preco = somas['VL_UNIT_COMERCIAL'] / somas['VOLUME']
+    preco.index = [_rotulo_periodo(int(chave), granularidade) for chave in preco.index]
+    return preco
+
+
+# Rótulo da barra que soma os grupos depois da página exibida
+OUTROS = 'Outros'
+
+
+# Página `pagina` (a partir de 1) do ranking decrescente de `serie`, com
+# `quantidade` grupos por página e a barra "Outros" somando os grupos das
+# páginas seguintes (os das páginas anteriores, maiores, ficam de fora). Os
+# maiores valores são separados com argpartition e apenas eles são ordenados,
+# sem ordenar todos os grupos. A página vem de um campo digitado: valores
+# fracionários são truncados e a página fica entre 1 e a última.
+def ranking(serie, quantidade, pagina=1):
+    quantidade = max(int(quantidade), 1)
+    valores = serie.to_numpy(dtype=np.float64)
+    ultima = max(-(-len(valores) // quantidade), 1)
+    pagina = min(max(int(pagina or 1), 1), ultima)
+    fim = min(pagina * quantidade, len(valores))
+    inicio = (pagina - 1) * quantidade
+    if fim < len(valores):
+        maiores = np.argpartition(-valores, fim - 1)[:fim]
+    else:
+        maiores = np.arange(len(valores))
+    ordem = maiores[np.argsort(-valores[maiores], kind='stable')][inicio:fim]
+    selecionados = pd.Series(valores[ordem], index=serie.index[ordem].astype(object))
+    if fim < len(valores):
+        selecionados[OUTROS] = valores.sum() - valores[maiores].sum()
+    return selecionados
+
+
+# Unidade do preço médio de cada parte do dataset
+UNIDADES = {'vol': 'R$/m³', 'area': 'R$/m²'}
+
+
+# Linhas de cada parte da pauta fiscal
+LINHAS_POR_PARTE_PAUTA = 50_000
+
+
+# Posição de cada nome na ordem alfabética das categorias
+def _posicao_alfabetica(coluna):
+    ordem = coluna.cat.categories.astype(str).argsort()
+    posicoes = np.empty(len(ordem), dtype=np.int64)
+    posicoes[ordem] = np.arange(len(ordem))
+    return posicoes[coluna.cat.codes.to_numpy()]
+
+
+def _parte_pauta(somas, unidade):
+    return pd.DataFrame({
+        'ESPECIE': somas['MADEIRA_NOME'].astype(str),
+        'APRESENTACAO': somas['APRESENTACAO_NOME'].astype(str),
+        'ANO_MES': somas['ANO_MES'],
+        'UNIDADE': unidade,
+        'PRECO_MEDIO': somas['VL_UNIT_COMERCIAL'] / somas['VOLUME'],
+        'QUANTIDADE': somas['VOLUME'],
+        'NOTAS': somas['LINHAS'],
+    }).reset_index(drop=True)
+
+
+# Pauta fiscal: preço médio (soma de VL_UNIT_COMERCIAL / soma de VOLUME) de
+# todas as combinações de espécie, apresentação e ano/mês, em partes de até
+# LINHAS_POR_PARTE_PAUTA linhas ordenadas por unidade, espécie, apresentação e
+# ano/mês. Cada cubo é agrupado e ordenado pelos códigos das categorias; as
+# colunas de texto só são montadas para a parte entregue, sem juntar a tabela
+# inteira. Sem nenhuma combinação, entrega uma parte vazia com as colunas.
+def pauta_fiscal(dataset):
+    vazia = None
+    for sufixo, unidade in sorted(UNIDADES.items(), key=lambda item: item[1]):
+        somas = dataset[f'cubo_{sufixo}'].groupby(['MADEIRA_NOME', 'APRESENTACAO_NOME', 'ANO_MES'], observed=True)[
+            ['VL_UNIT_COMERCIAL', 'VOLUME', 'LINHAS']].sum().reset_index()
+        if somas.empty:
+            vazia = _parte_pauta(somas, unidade) if vazia is None else vazia
+            continue
+        ordem = np.lexsort((somas['ANO_MES'].to_numpy(), _posicao_alfabetica(somas['APRESENTACAO_NOME']),
+                            _posicao_alfabetica(somas['MADEIRA_NOME'])))
+        for inicio in range(0, len(ordem), LINHAS_POR_PARTE_PAUTA):
+            yield _parte_pauta(somas.iloc[ordem[inicio:inicio + LINHAS_POR_PARTE_PAUTA]], unidade)
+            vazia = False
+    if vazia is not False:
+        yield vazia
+
+
+# Estimadores de preço médio por espécie e apresentação: valor do seletor -> rótulo
+ESTIMADORES = {
+    'media': 'Média (soma/soma)',
+    'mediana': 'Mediana',
+    'media_aparada': 'Média aparada (10%)',
+    'media_iqr': 'Média sem outliers (IQR)',
+    'media_mad': 'Média sem outliers (MAD)',
+}
+# Fração descartada em cada ponta na média aparada
+APARAR = 0.1
+# Linhas fora de [Q1 - 1.5 IQR, Q3 + 1.5 IQR] ou a mais de 3 desvios (MAD
+# escalado para a normal) da mediana são descartadas nas médias filtradas
+LIMITE_IQR = 1.5
+LIMITE_MAD = 3.0
+_ESCALA_MAD = 1.4826
+
+
+# Quantil (interpolação linear, como np.quantile) de cada grupo de um vetor
+# ordenado dentro dos grupos
+def _quantil(ordenado, inicios, contagens, q):
+    posicao = inicios + (contagens - 1) * q
+    abaixo = np.floor(posicao).astype(np.int64)
+    acima = np.minimum(abaixo + 1, inicios + contagens - 1)
+    return ordenado[abaixo] + (ordenado[acima] - ordenado[abaixo]) * (posicao - abaixo)
+
+
+# Preço unitário (VL_UNIT_COMERCIAL / VOLUME) de cada linha resumido por
+# estimadores robustos para todas as combinações de espécie e apresentação de
+# uma vez: as linhas são ordenadas por (grupo, preço) e medianas, quartis e
+# médias aparadas saem por aritmética de índices e somas acumuladas, sem laço
+# por grupo. As médias filtradas mantêm a razão soma/soma das linhas restantes.
+def precos_robustos(df):
+    especies = df['MADEIRA_NOME'].cat.codes.to_numpy().astype(np.int64)
+    apresentacoes = df['APRESENTACAO_NOME'].cat.codes.to_numpy().astype(np.int64)
+    total_apresentacoes = max(len(df['APRESENTACAO_NOME'].cat.categories), 1)
+    valor = df['VL_UNIT_COMERCIAL'].to_numpy(dtype=np.float64)
+    volume = df['VOLUME'].to_numpy(dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        preco = valor / volume
+    valido = (especies >= 0) & (apresentacoes >= 0) & np.isfinite(preco)
+    grupo = (especies * total_apresentacoes + apresentacoes)[valido]
+    ordem = np.lexsort((preco[valido], grupo))
+    grupo, preco = grupo[ordem], preco[valido][ordem]
+    valor, volume = valor[valido][ordem], volume[valido][ordem]
+
+    inicios = np.flatnonzero(np.r_[True, grupo[1:] != grupo[:-1]]) if len(grupo) else np.empty(0, dtype=np.int64)
+    contagens = np.diff(np.r_[inicios, len(grupo)])
+    rotulo = np.repeat(np.arange(len(inicios)), contagens)
+    mediana = _quantil(preco, inicios, contagens, 0.5)
+    q1, q3 = _quantil(preco, inicios, contagens, 0.25), _quantil(preco, inicios, contagens, 0.75)
+
+    acumulado = np.r_[0.0, np.cumsum(preco)]
+    aparadas = np.floor(contagens * APARAR).astype(np.int64)
+    media_aparada = ((acumulado[inicios + contagens - aparadas] - acumulado[inicios + aparadas])
+                     / (contagens - 2 * aparadas))
+
+    iqr = q3 - q1
+    dentro_iqr = (preco >= (q1 - LIMITE_IQR * iqr)[rotulo]) & (preco <= (q3 + LIMITE_IQR * iqr)[rotulo])
+    desvio = np.abs(preco - mediana[rotulo])
+    mad = _quantil(desvio[np.lexsort((desvio, rotulo))], inicios, contagens, 0.5)
+    dentro_mad = desvio <= (LIMITE_MAD * _ESCALA_MAD * mad)[rotulo]
+
+    def razao(mascara):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (np.bincount(rotulo, weights=valor * mascara, minlength=len(inicios))
+                    / np.bincount(rotulo, weights=volume * mascara, minlength=len(inicios)))
+
+    grupos = grupo[inicios]
+    return pd.DataFrame({
+        'MADEIRA_NOME': pd.Categorical.from_codes(grupos // total_apresentacoes,
+                                                  categories=df['MADEIRA_NOME'].cat.categories),
+        'APRESENTACAO_NOME': pd.Categorical.from_codes(grupos % total_apresentacoes,
+                                                       categories=df['APRESENTACAO_NOME'].cat.categories),
+        'MEDIA': razao(np.ones(len(preco))),
+        'MEDIANA': mediana,
+        'MEDIA_APARADA': media_aparada,
+        'MEDIA_IQR': razao(dentro_iqr),
+        'MEDIA_MAD': razao(dentro_mad),
+        'LINHAS': contagens,
+    })
+
+
+# Tabela de precos_robustos de `df` a partir da tabela `precos` das linhas
+# anteriores a um acréscimo: só os grupos (espécie, apresentação) que aparecem
+# em `incremento` são recalculados, sobre as linhas de `df` desses grupos; os
+# demais vêm de `precos`. `df` e `incremento` usam as mesmas categorias, das
+# quais as de `precos` são um prefixo (ingestao.acrescentar).
+def atualizar_precos_robustos(precos, df, incremento):
+    total_apresentacoes = max(len(df['APRESENTACAO_NOME'].cat.categories), 1)
+
+    def grupos(tabela):
+        return (tabela['MADEIRA_NOME'].cat.codes.to_numpy().astype(np.int64) * total_apresentacoes
+                + tabela['APRESENTACAO_NOME'].cat.codes.to_numpy().astype(np.int64))
+
+    tocados = np.unique(grupos(incremento))
+    recalculados = precos_robustos(df[np.isin(grupos(df), tocados)])
+    precos = precos.assign(**{coluna: precos[coluna].cat.set_categories(df[coluna].cat.categories)
+                              for coluna in ('MADEIRA_NOME', 'APRESENTACAO_NOME')})
+    mantidos = precos[~np.isin(grupos(precos), tocados)]
+    resultado = pd.concat([mantidos, recalculados], ignore_index=True)
+    return resultado.iloc[np.argsort(grupos(resultado), kind='stable')].reset_index(drop=True)
+
+
+# Consulta de agregados da API: dimensão do parâmetro `por` -> coluna do
+# resultado, e métrica do parâmetro `metrica` -> coluna do resultado
+DIMENSOES_CONSULTA = {'especie': 'ESPECIE', 'apresentacao': 'APRESENTACAO', 'periodo': 'PERIODO'}
+METRICAS_CONSULTA = {'quantidade': 'QUANTIDADE', 'valor': 'VALOR', 'preco': 'PRECO_MEDIO', 'notas': 'NOTAS'}
+
+
+# Somas de uma parte do dataset ('vol' ou 'area') agrupadas pelas dimensões de
+# `por`, filtradas por nomes de espécie e de apresentação e pelo intervalo de
+# datas [inicio, fim] (AAAAMM ou AAAAMMDD). A consulta usa o cubo, salvo quando
+# precisa de dias (granularidade diária ou limite com dia), que exigem as linhas.
+def consultar(dataset, parte, por=(), metricas=tuple(METRICAS_CONSULTA), especies=(), apresentacoes=(),
+              inicio=None, fim=None, granularidade='mes'):
+    if granularidade not in GRANULARIDADES:
+        raise ValueError(f'Granularidade inválida: {granularidade}')
+    diario = granularidade == 'dia' or any(limite is not None and limite > 999999 for limite in (inicio, fim))
+    dados = dataset[f'df_{parte}'] if diario else dataset[f'cubo_{parte}']
+    mascara = np.ones(len(dados), dtype=bool)
+    for coluna, nomes in (('MADEIRA_NOME', especies), ('APRESENTACAO_NOME', apresentacoes)):
+        if nomes:
+            codigos = dados[coluna].cat.categories.get_indexer(list(nomes))
+            mascara &= np.isin(dados[coluna].cat.codes.to_numpy(), codigos[codigos >= 0])
+    datas = (dados['SK_DATA'] if diario else dados['ANO_MES']).to_numpy()
+    if inicio is not None:
+        mascara &= datas >= (inicio * 100 + 1 if diario and inicio <= 999999 else inicio)
+    if fim is not None:
+        mascara &= datas <= (fim * 100 + 31 if diario and fim <= 999999 else fim)
+    dados = dados[mascara]
+    if 'LINHAS' not in dados:
+        dados = dados.assign(LINHAS=1)
+
+    chaves = {'especie': dados['MADEIRA_NOME'], 'apresentacao': dados['APRESENTACAO_NOME'],
+              'periodo': _chave_periodo(dados, granularidade).rename('PERIODO')}
+    colunas = [chaves[dimensao] for dimensao in por]
+    if colunas:
+        somas = dados.groupby(colunas, observed=True)[['VL_UNIT_COMERCIAL', 'VOLUME', 'LINHAS']].sum().reset_index()
+    else:
+        somas = dados[['VL_UNIT_COMERCIAL', 'VOLUME', 'LINHAS']].sum().to_frame().T
+    resultado = pd.DataFrame(index=somas.index)
+    for dimensao in por:
+        coluna = chaves[dimensao].name
+        resultado[DIMENSOES_CONSULTA[dimensao]] = somas[coluna].astype(str) if dimensao != 'periodo' else somas[coluna]
+    valores = {'quantidade': somas['VOLUME'], 'valor': somas['VL_UNIT_COMERCIAL'],
+               'preco': somas['VL_UNIT_COMERCIAL'] / somas['VOLUME'], 'notas': somas['LINHAS'].astype(np.int64)}
+    for metrica in metricas:
+        resultado[METRICAS_CONSULTA[metrica]] = valores[metrica].to_numpy()
+    resultado = resultado.sort_values([DIMENSOES_CONSULTA[dimensao] for dimensao in por], ignore_index=True)
+    if 'periodo' in por:
+        resultado['PERIODO'] = [_rotulo_periodo(int(chave), granularidade) for chave in resultado['PERIODO']]
+    return resultado
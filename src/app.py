@@ -1,11 +1,28 @@
+import os
+import pathlib
+
 import dash
+import diskcache
+from dash import DiskcacheManager
 
+# Fila das tarefas em segundo plano (importação do CSV). O estado e o
+# progresso das tarefas ficam gravados em disco, compartilhados entre os
+# processos de trabalho e o servidor web.
+PATH = pathlib.Path(__file__).parent
+TAREFAS_PATH = pathlib.Path(os.environ.get('MADEIRA_TAREFAS_DIR', PATH.joinpath('../cache/tarefas'))).resolve()
+background_callback_manager = DiskcacheManager(diskcache.Cache(str(TAREFAS_PATH)))
 
 # meta_tags are required for the app layout to be mobile responsive
-app = dash.Dash(__name__, suppress_callback_exceptions=True,
+# compress=True: respostas dos callbacks comprimidas (gzip/brotli) pelo Flask-Compress
+app = dash.Dash(__name__, suppress_callback_exceptions=True, compress=True,
+                background_callback_manager=background_callback_manager,
                 meta_tags=[{'name': 'viewport',
                             'content': 'width=device-width, initial-scale=1.0'}]
                 )
 
 
 server = app.server
+# Tamanho máximo (em MB) do corpo de uma requisição: o CSV da rota
+# /importar/csv e o upload em base64 dos callbacks. Acima dele o Flask
+# responde 413 sem ler o corpo.
+server.config['MAX_CONTENT_LENGTH'] = int(float(os.environ.get('MADEIRA_LIMITE_ENVIO_MB', 1024)) * 1024 * 1024)
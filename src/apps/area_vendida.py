@@ -1,16 +1,18 @@
-import pandas as pd
 from dash import html, dcc, Input, Output, State
 import plotly.graph_objs as go
 import pathlib
 from app import app
+import registro
+import agregados
+import cache_figuras
+import sob_demanda
+
+pd = sob_demanda.importar('pandas')
 
 # get relative data folder
 PATH = pathlib.Path(__file__).parent
 DATA_PATH = PATH.joinpath("../datasets").resolve()
 
-# Definir df_area como uma variável global na página
-df_area = pd.DataFrame()
-
 # Layout do aplicativo
 layout = html.Div([
     dcc.RadioItems(
@@ -22,6 +24,21 @@ layout = html.Div([
         value='apresentacao',  # Valor padrão selecionado
         labelStyle={'display': 'inline-block'}
     ),
+    html.Div([
+        dcc.RadioItems(
+            id='top-n-area',
+            options=[
+                {'label': 'Todos', 'value': 0},
+                {'label': 'Top 10', 'value': 10},
+                {'label': 'Top 20', 'value': 20},
+                {'label': 'Top 50', 'value': 50}
+            ],
+            value=0,  # Todos os grupos, sem a barra "Outros"
+            labelStyle={'display': 'inline-block'}
+        ),
+        html.Label('Página', htmlFor='pagina-area'),
+        dcc.Input(id='pagina-area', type='number', min=1, step=1, value=1)
+    ]),
     html.Div(id='warning-message-area', style={'display': 'block'}),
     html.Div(
         dcc.Graph(id='bar-pai-area'),
@@ -39,52 +56,71 @@ layout = html.Div([
     ], className="multiplos-graph")
 ])
 
-# Função para atualizar o dataframe com base nos dados enviados pelo usuário
-def update_dataframe(stored_data):
-    global df_area
-    if stored_data is not None and 'df_area' in stored_data:
-        df_area = pd.DataFrame(stored_data['df_area'])
+# Função para obter o cubo de agregação da sessão a partir da chave guardada no dcc.Store.
+# Cada callback busca os próprios dados, sem estado global compartilhado entre usuários.
+def carregar_cubo(stored_data):
+    dados = registro.obter(stored_data, 'cubo_area')
+    return pd.DataFrame() if dados is None else dados
 
 @app.callback(
     Output('warning-message-area', 'children'),
     [Input('data-store', 'data')]
 )
 def display_warning_message(stored_data):
-    if df_area.empty:
+    cubo_area = carregar_cubo(stored_data)
+    if cubo_area.empty:
         # Se não houver dados armazenados, retorna uma mensagem
         return "Importe o arquivo csv primeiro"
     else:
         return ""
     
-@app.callback(
+app.clientside_callback(
+    """
+    function(stored_data) {
+        // Oculta o contêiner enquanto não houver dados importados
+        return (stored_data && Object.keys(stored_data).length) ? {'display': 'block'} : {'display': 'none'};
+    }
+    """,
     Output('bar-container-pai-area', 'style'),
     [Input('data-store', 'data')]
 )
-def update_bar_visibility_pai(stored_data):
-    if not stored_data:
-        return {'display': 'none'}
-    else:
-        return {'display': 'block'}
     
+# Volta para a primeira página ao trocar o agrupamento ou o tamanho do ranking
+app.clientside_callback(
+    """
+    function(radio_value, top_n) {
+        return 1;
+    }
+    """,
+    Output('pagina-area', 'value'),
+    [Input('radio-selection-area-vendido', 'value'),
+     Input('top-n-area', 'value')]
+)
+
 @app.callback(
     Output('bar-pai-area', 'figure'),
-    [Input('radio-selection-area-vendido', 'value')],
+    [Input('radio-selection-area-vendido', 'value'),
+     Input('top-n-area', 'value'),
+     Input('pagina-area', 'value')],
     [State('data-store', 'data')]  # Adicione State para acessar os dados do dcc.Store
 )
-def update_bar_chart_pai(radio_value, stored_data):
-    update_dataframe(stored_data)
+@cache_figuras.memorizar
+def update_bar_chart_pai(radio_value, top_n, pagina, stored_data):
+    cubo_area = carregar_cubo(stored_data)
     
     if radio_value == 'apresentacao':
-        quantidade_calculada = df_area.groupby('APRESENTACAO_NOME')['VOLUME'].sum()
+        quantidade_calculada = cubo_area.groupby('APRESENTACAO_NOME', observed=True)['VOLUME'].sum()
         # Ordenar quantidade_calculada de acordo com a seleção 
-        quantidade_calculada = quantidade_calculada.reindex(df_area['APRESENTACAO_NOME'].unique())
+        quantidade_calculada = quantidade_calculada.reindex(cubo_area['APRESENTACAO_NOME'].cat.categories)
     else:
-        quantidade_calculada = df_area.groupby('MADEIRA_NOME')['VOLUME'].sum()
+        quantidade_calculada = cubo_area.groupby('MADEIRA_NOME', observed=True)['VOLUME'].sum()
         # Ordenar quantidade_calculada de acordo com a seleção 
-        quantidade_calculada = quantidade_calculada.reindex(df_area['MADEIRA_NOME'].unique())
-        
-    
-    
+        quantidade_calculada = quantidade_calculada.reindex(cubo_area['MADEIRA_NOME'].cat.categories)
+
+    if top_n:
+        # Apenas os maiores grupos da página escolhida; os demais somados em "Outros"
+        quantidade_calculada = agregados.ranking(quantidade_calculada.dropna(), top_n, pagina or 1)
+
     # Criar o gráfico de barras
     fig = go.Figure(data=[go.Bar(x=quantidade_calculada.index, 
                                   y=quantidade_calculada.values,
@@ -100,48 +136,54 @@ def update_bar_chart_pai(radio_value, stored_data):
 
 
 # Callback para atualizar a visibilidade do gráfico com base nas seleções do usuário
-@app.callback(
+app.clientside_callback(
+    """
+    function(click_data) {
+        // Oculta o contêiner enquanto não houver clique nas barras
+        return (click_data === null || click_data === undefined) ? {'display': 'none'} : {'display': 'block'};
+    }
+    """,
     Output('bar-container-area-vendido', 'style'),
     [Input('bar-pai-area', 'clickData')]
 )
-def update_bar_visibility(click_data):
-    if click_data is None:
-        # Se não houver clique nas barras, oculta o contêiner do gráfico de pizza
-        return {'display': 'none'}
-    else:
-        # Caso contrário, exibe o contêiner do gráfico de pizza
-        return {'display': 'block'}
 
 # Callback para atualizar o gráfico de barras com base na espécie de madeira selecionada
 @app.callback(
     Output('bar-chart-area-vendido', 'figure'),
     [Input('bar-pai-area', 'clickData'),
-     Input('radio-selection-area-vendido', 'value')]
+     Input('radio-selection-area-vendido', 'value'),
+     Input('top-n-area', 'value')],
+    [State('data-store', 'data')]
 )
-def update_bar_chart_filho(clickData, radio_value):
-    if clickData is None or df_area.empty:
+@cache_figuras.memorizar
+def update_bar_chart_filho(clickData, radio_value, top_n, stored_data):
+    cubo_area = carregar_cubo(stored_data)
+    if clickData is None or cubo_area.empty or clickData['points'][0]['x'] == agregados.OUTROS:
         # Retorna um gráfico vazio se nenhum ponto for clicado ou nenhuma espécie for selecionada
         return {}
 
-    click_index = clickData['points'][0]['pointIndex']
+    # A barra é identificada pelo nome: com o ranking a posição não é o código da categoria
+    nome = clickData['points'][0]['x']
 
     if radio_value == 'apresentacao':
-        nome = df_area['APRESENTACAO_NOME'].unique()[click_index]
         seletor = 'APRESENTACAO_NOME'
         agrupamento = 'MADEIRA_NOME'
         texto_titulo = 'para cada ESPECIE'
         x_title = 'ESPECIE'
     else:
-        nome = df_area['MADEIRA_NOME'].unique()[click_index]
         seletor = 'MADEIRA_NOME'
         agrupamento = 'APRESENTACAO_NOME'
         texto_titulo = 'para cada APRESENTACAO'
         x_title = 'APRESENTACAO'
 
-    quantidade_calculada = df_area[df_area[seletor] == nome].groupby(agrupamento)['VOLUME'].sum()
+    quantidade_calculada = cubo_area[agregados.mascara_nome(cubo_area[seletor], nome)].groupby(agrupamento, observed=True)['VOLUME'].sum()
 
     # Ordenar quantidade_calculada de acordo com a seleção 
-    quantidade_calculada = quantidade_calculada.reindex(df_area[agrupamento].unique())
+    quantidade_calculada = quantidade_calculada.reindex(cubo_area[agrupamento].cat.categories)
+
+    if top_n:
+        # Maiores grupos da seleção, com os demais somados em "Outros"
+        quantidade_calculada = agregados.ranking(quantidade_calculada.dropna(), top_n)
 
     # Criar o gráfico de barras
     fig = go.Figure(data=[go.Bar(x=quantidade_calculada.index, 
@@ -158,28 +200,30 @@ def update_bar_chart_filho(clickData, radio_value):
     return fig
 
 # Callback para atualizar a visibilidade do gráfico de pizza com base no clique nas barras
-@app.callback(
+app.clientside_callback(
+    """
+    function(click_data) {
+        // Oculta o contêiner enquanto não houver clique nas barras
+        return (click_data === null || click_data === undefined) ? {'display': 'none'} : {'display': 'block'};
+    }
+    """,
     Output('pie-container-area-vendido', 'style'),
     [Input('bar-chart-area-vendido', 'clickData')]
 )
-def update_pie_visibility(click_data):
-    if click_data is None:
-        # Se não houver clique nas barras, oculta o contêiner do gráfico de pizza
-        return {'display': 'none'}
-    else:
-        # Caso contrário, exibe o contêiner do gráfico de pizza
-        return {'display': 'block'}
-
 
 # Callback para criar o gráfico de pizza com base no clique nas barras do gráfico de barras
 @app.callback(
     Output('pie-chart_area_vendido', 'figure'),  # Alterado para 'figure'
     [Input('bar-pai-area', 'clickData'),
      Input('bar-chart-area-vendido', 'clickData'),
-     Input('radio-selection-area-vendido', 'value')]
+     Input('radio-selection-area-vendido', 'value')],
+    [State('data-store', 'data')]
 )
-def update_pie_chart(clickDataPai, clickDataFilho, radio_value):
-    if clickDataPai is None or clickDataFilho is None or df_area.empty:
+@cache_figuras.memorizar
+def update_pie_chart(clickDataPai, clickDataFilho, radio_value, stored_data):
+    cubo_area = carregar_cubo(stored_data)
+    if (clickDataPai is None or clickDataFilho is None or cubo_area.empty
+            or agregados.OUTROS in (clickDataPai['points'][0]['x'], clickDataFilho['points'][0]['x'])):
         # Retorna um gráfico vazio se nenhum ponto for clicado ou nenhuma espécie for selecionada
         return {}
 
@@ -189,14 +233,14 @@ def update_pie_chart(clickDataPai, clickDataFilho, radio_value):
     if radio_value == 'apresentacao':
         texto_adicional = f'{click_pai} ({click_filho})'
         # Filtrar o DataFrame para obter os dados relevantes
-        dados_selecionados = df_area[(df_area['APRESENTACAO_NOME'] == click_pai) & (df_area['MADEIRA_NOME'] == click_filho)]
+        dados_selecionados = cubo_area[agregados.mascara_nome(cubo_area['APRESENTACAO_NOME'], click_pai) & agregados.mascara_nome(cubo_area['MADEIRA_NOME'], click_filho)]
     else:
         texto_adicional = f'{click_filho} ({click_pai})'
         # Filtrar o DataFrame para obter os dados relevantes
-        dados_selecionados = df_area[(df_area['APRESENTACAO_NOME'] == click_filho) & (df_area['MADEIRA_NOME'] == click_pai)]
+        dados_selecionados = cubo_area[agregados.mascara_nome(cubo_area['APRESENTACAO_NOME'], click_filho) & agregados.mascara_nome(cubo_area['MADEIRA_NOME'], click_pai)]
 
-        # Contar as categorias de df_area_final['COD_MODELO']
-    contagem_categorias = dados_selecionados['COD_MODELO'].value_counts()
+    # Contar as linhas de cada categoria de COD_MODELO, da mais frequente para a menos frequente
+    contagem_categorias = dados_selecionados.groupby('COD_MODELO')['LINHAS'].sum().sort_values(ascending=False)
 
     # Criar o gráfico de pizza
     fig_pie = go.Figure(data=[go.Pie(labels=['Prestação de Serviços', 'Varejo'], 
@@ -1,17 +1,19 @@
-import pandas as pd
 from dash import html, dcc, Input, Output, State
 import plotly.graph_objs as go
-import plotly.express as px
 import pathlib
 from app import app
+import registro
+import agregados
+import cache_figuras
+import sob_demanda
+
+pd = sob_demanda.importar('pandas')
+px = sob_demanda.importar('plotly.express')
 
 # get relative data folder
 PATH = pathlib.Path(__file__).parent
 DATA_PATH = PATH.joinpath("../datasets").resolve()
 
-# Definir df_area como uma variável global na página
-df_area = pd.DataFrame()
-
 # Layout do aplicativo
 layout = html.Div([
     dcc.RadioItems(
@@ -24,21 +26,38 @@ layout = html.Div([
         labelStyle={'display': 'inline-block'}
     ),
     html.Div(id='dropdown-container-area'),
-    html.Div(
-        dcc.Graph(id='bar-preco-area'),
+    html.Div([
+        dcc.RadioItems(
+            id='estimador-preco-area',
+            options=[{'label': rotulo, 'value': valor} for valor, rotulo in agregados.ESTIMADORES.items()],
+            value='media',  # Valor padrão selecionado
+            labelStyle={'display': 'inline-block'}
+        ),
+        dcc.Graph(id='bar-preco-area')],
         id='bar-container-preco-area',
         style={'display': 'none'}),
-    html.Div(
-        dcc.Graph(id='line-preco_area'),
+    html.Div([
+        dcc.RadioItems(
+            id='granularidade-preco-area',
+            options=[
+                {'label': 'Diária', 'value': 'dia'},
+                {'label': 'Mensal', 'value': 'mes'},
+                {'label': 'Trimestral', 'value': 'trimestre'},
+                {'label': 'Anual', 'value': 'ano'}
+            ],
+            value='mes',  # Valor padrão selecionado
+            labelStyle={'display': 'inline-block'}
+        ),
+        dcc.Graph(id='line-preco_area')],
         id='lline-container-preco-area',
         style={'display': 'none'})  # Container vazio para o gráfico de pizza
 ])
 
-# Função para atualizar o dataframe com base nos dados enviados pelo usuário
-def update_dataframe(stored_data):
-    global df_area
-    if stored_data is not None and 'df_area' in stored_data:
-        df_area = pd.DataFrame(stored_data['df_area'])
+# Função para obter o dataframe (ou o cubo de agregação) da sessão a partir da chave guardada no dcc.Store.
+# Cada callback busca os próprios dados, sem estado global compartilhado entre usuários.
+def carregar_dataframe(stored_data, nome='df_area'):
+    dados = registro.obter(stored_data, nome)
+    return pd.DataFrame() if dados is None else dados
 
 # Callback para atualizar o dropdown com base na seleção do botão de rádio
 @app.callback(
@@ -47,15 +66,15 @@ def update_dataframe(stored_data):
     [State('data-store', 'data')]  # Adicione State para acessar os dados do dcc.Store
 )
 def update_dropdown(selection, stored_data):
-    update_dataframe(stored_data)
-    if df_area.empty:
+    cubo_area = carregar_dataframe(stored_data, 'cubo_area')
+    if cubo_area.empty:
         # Se não houver dados armazenados, retorna uma mensagem vazia
         return "Importe o arquivo csv primeiro"
     
     if selection == 'apresentacao':
         return dcc.Dropdown(
             id='dropdown-area',
-            options=[{'label': apresentacao, 'value': idx} for idx, apresentacao in enumerate(df_area['APRESENTACAO_NOME'].unique())],
+            options=[{'label': apresentacao, 'value': idx} for idx, apresentacao in enumerate(cubo_area['APRESENTACAO_NOME'].cat.categories)],
             value=None,  # Definir o valor inicial como None
             style={'width': '50%'},
             placeholder="Selecione a Apresentação",
@@ -63,53 +82,67 @@ def update_dropdown(selection, stored_data):
     else:
         return dcc.Dropdown(
             id='dropdown-area',
-            options=[{'label': especie, 'value': idx} for idx, especie in enumerate(df_area['MADEIRA_NOME'].unique())],
+            options=[{'label': especie, 'value': idx} for idx, especie in enumerate(cubo_area['MADEIRA_NOME'].cat.categories)],
             value=None,  # Definir o valor inicial como None
             style={'width': '50%'},
             placeholder="Selecione a Espécie",
         )
 
 # Callback para atualizar a visibilidade do gráfico com base nas seleções do usuário
-@app.callback(
+app.clientside_callback(
+    """
+    function(seletor_index) {
+        // Oculta o contêiner enquanto não houver seleção no dropdown
+        return (seletor_index === null || seletor_index === undefined) ? {'display': 'none'} : {'display': 'block'};
+    }
+    """,
     Output('bar-container-preco-area', 'style'),
     [Input('dropdown-area', 'value')]
 )
-def update_bar_visibility(seletor_index):
-    if seletor_index is None:
-        # Se o dropdown for None, oculta o contêiner do gráfico
-        return {'display': 'none'}
-    else:
-        # Caso contrário, exibe o contêiner do gráfico
-        return {'display': 'block'}
 
 # Callback para atualizar o gráfico de barras com base na seleção do dropdown e do rádio
 @app.callback(
     Output('bar-preco-area', 'figure'),
     [Input('dropdown-area', 'value'),
-     Input('radio-selection-area', 'value')]  
+     Input('radio-selection-area', 'value'),
+     Input('estimador-preco-area', 'value')],
+    [State('data-store', 'data')]
 )
-def update_bar_chart(selection_index, radio_value):
-    if selection_index is None or df_area.empty:
+@cache_figuras.memorizar
+def update_bar_chart(selection_index, radio_value, estimador, stored_data):
+    cubo_area = carregar_dataframe(stored_data, 'cubo_area')
+    if selection_index is None or cubo_area.empty:
         # Retorna um gráfico vazio se nenhuma seleção for feita ou se o dataframe estiver vazio
         return go.Figure()
 
     if radio_value == 'apresentacao':
-        nome = df_area['APRESENTACAO_NOME'].unique()[selection_index]
+        nome = cubo_area['APRESENTACAO_NOME'].cat.categories[selection_index]
         dropdown = 'APRESENTACAO_NOME'
         agrupamento = 'MADEIRA_NOME'
         texto_titulo = 'para cada ESPECIE'
         x_title = 'ESPECIE'
     else:
-        nome = df_area['MADEIRA_NOME'].unique()[selection_index]
+        nome = cubo_area['MADEIRA_NOME'].cat.categories[selection_index]
         dropdown = 'MADEIRA_NOME'
         agrupamento = 'APRESENTACAO_NOME'
         texto_titulo = 'para cada APRESENTACAO'
         x_title = 'APRESENTACAO'
 
-    quantidade_calculada = ((df_area[df_area[dropdown] == nome].groupby(agrupamento)['VL_UNIT_COMERCIAL'].sum())/(df_area[df_area[dropdown] == nome].groupby(agrupamento)['VOLUME'].sum()))
+    if estimador in (None, 'media'):
+        somas = cubo_area[agregados.mascara_codigo(cubo_area[dropdown], selection_index)].groupby(agrupamento, observed=True)[['VL_UNIT_COMERCIAL', 'VOLUME']].sum()
+        quantidade_calculada = somas['VL_UNIT_COMERCIAL'] / somas['VOLUME']
+    else:
+        # Estimadores robustos já calculados na importação para todos os grupos
+        precos = carregar_dataframe(stored_data, 'precos_area')
+        if precos.empty:
+            # Dataset gravado antes dos preços robustos
+            precos = agregados.precos_robustos(carregar_dataframe(stored_data, 'df_area'))
+        precos = precos[agregados.mascara_codigo(precos[dropdown], selection_index)]
+        quantidade_calculada = pd.Series(precos[estimador.upper()].to_numpy(), index=precos[agrupamento].astype(object))
+        texto_titulo += f' - {agregados.ESTIMADORES[estimador]}'
 
     # Ordenar quantidade_calculada de acordo com as apresentações de madeira
-    quantidade_calculada = quantidade_calculada.reindex(df_area[agrupamento].unique())
+    quantidade_calculada = quantidade_calculada.reindex(cubo_area[agrupamento].cat.categories)
 
     # Criar o gráfico de barras
     fig = go.Figure(data=[go.Bar(x=quantidade_calculada.index, 
@@ -126,71 +159,63 @@ def update_bar_chart(selection_index, radio_value):
     return fig
 
 # Callback para atualizar a visibilidade do gráfico de pizza com base no clique nas barras
-@app.callback(
+app.clientside_callback(
+    """
+    function(click_data) {
+        // Oculta o contêiner enquanto não houver clique nas barras
+        return (click_data === null || click_data === undefined) ? {'display': 'none'} : {'display': 'block'};
+    }
+    """,
     Output('lline-container-preco-area', 'style'),
     [Input('bar-preco-area', 'clickData')]
 )
-def update_line_visibility(click_data):
-    if click_data is None:
-        # Se não houver clique nas barras, oculta o contêiner do gráfico de pizza
-        return {'display': 'none'}
-    else:
-        # Caso contrário, exibe o contêiner do gráfico de pizza
-        return {'display': 'block'}
     
 # Callback para limpar o clique nas barras quando o dropdown é alterado
-@app.callback(
+app.clientside_callback(
+    """
+    function(seletor_index) {
+        // Limpa o clique nas barras ao alterar o dropdown
+        return null;
+    }
+    """,
     Output('bar-preco-area', 'clickData'),
     [Input('dropdown-area', 'value')]
 )
-def clear_bar_click_data(seletor_index):
-    # Retorna None para limpar o clique nas barras ao alterar o dropdown
-    return None
 
 # Callback para criar o gráfico de linha com base no clique nas barras do gráfico de barras
 @app.callback(
     Output('line-preco_area', 'figure'),  # Alterado para 'figure'
     [Input('bar-preco-area', 'clickData'),
      Input('dropdown-area', 'value'),
-     Input('radio-selection-area', 'value')]
+     Input('radio-selection-area', 'value'),
+     Input('granularidade-preco-area', 'value')],
+    [State('data-store', 'data')]
 )
-def update_line_chart(clickData, seletor_index, radio_value):
-    if clickData is None or seletor_index is None or df_area.empty:
+@cache_figuras.memorizar
+def update_line_chart(clickData, seletor_index, radio_value, granularidade, stored_data):
+    # A série diária precisa das linhas do dataset; as demais granularidades usam o cubo
+    dados = carregar_dataframe(stored_data, 'df_area' if granularidade == 'dia' else 'cubo_area')
+    if clickData is None or seletor_index is None or dados.empty:
         # Retorna um gráfico vazio se nenhum ponto for clicado ou nenhuma espécie for selecionada
         return {}
 
     click_nome = clickData['points'][0]['x']
 
-    ano_mes = []
-    preco_volume_mes = []
-
     if radio_value == 'apresentacao':
-        dropdown_selecionado = df_area['APRESENTACAO_NOME'].unique()[seletor_index]
+        dropdown_selecionado = dados['APRESENTACAO_NOME'].cat.categories[seletor_index]
         # Filtrar o DataFrame para obter os dados relevantes
-        dados_selecionados = df_area[(df_area['APRESENTACAO_NOME'] == dropdown_selecionado) & (df_area['MADEIRA_NOME'] == click_nome)]
+        dados_selecionados = dados[agregados.mascara_codigo(dados['APRESENTACAO_NOME'], seletor_index) & agregados.mascara_nome(dados['MADEIRA_NOME'], click_nome)]
     else:
-        dropdown_selecionado = df_area['MADEIRA_NOME'].unique()[seletor_index]
+        dropdown_selecionado = dados['MADEIRA_NOME'].cat.categories[seletor_index]
         # Filtrar o DataFrame para obter os dados relevantes
-        dados_selecionados = df_area[(df_area['APRESENTACAO_NOME'] == click_nome) & (df_area['MADEIRA_NOME'] == dropdown_selecionado)]
-    
-    
-    #SK_DATA to datetime
-    dados_selecionados['SK_DATA'] = pd.to_datetime(dados_selecionados['SK_DATA'], format='%Y%m%d')
-    # Extrair o ano e o mês da coluna SK_DATA
-    dados_selecionados['ANO'] = dados_selecionados['SK_DATA'].dt.year
-    dados_selecionados['MES'] = dados_selecionados['SK_DATA'].dt.month
-    for ano in sorted(dados_selecionados['ANO'].unique()):
-        for mes in sorted(dados_selecionados['MES'].unique()):
-            dados_temporais = dados_selecionados[(dados_selecionados['ANO'] == ano) & (dados_selecionados['MES'] == mes)]
-            # Calculando e adicionando o preço médio por volume à lista
-            if len(dados_temporais) > 0:
-                preco_volume_mes.append((dados_temporais['VL_UNIT_COMERCIAL'].sum()) / (dados_temporais['VOLUME'].sum()))
-                # Adicionando o ano e o mês formatados como 'ANO/MES' à lista
-                ano_mes.append(f'{ano}/{mes}')
+        dados_selecionados = dados[agregados.mascara_nome(dados['APRESENTACAO_NOME'], click_nome) & agregados.mascara_codigo(dados['MADEIRA_NOME'], seletor_index)]
+
+    # Preço médio por período em um único agrupamento sobre SK_DATA
+    preco_periodo = agregados.serie_preco(dados_selecionados, granularidade)
 
     # Criar o gráfico de linha
-    fig_line = px.line(x=ano_mes, y=preco_volume_mes, 
-                labels={'y': 'Média (R$/M²)', 'x': 'Ano/Mês'})
+    fig_line = px.line(x=preco_periodo.index, y=preco_periodo.values, 
+                labels={'y': 'Média (R$/M²)', 'x': agregados.GRANULARIDADES[granularidade]})
 
     # Adicionar título
     fig_line.update_layout(title=f'Preço Médio por Área ao Longo do Tempo - {dropdown_selecionado} ({click_nome})',
@@ -0,0 +1,98 @@
+import os
+import pathlib
+import re
+import shutil
+import time
+
+import sob_demanda
+
+feather = sob_demanda.importar('pyarrow.feather')
+
+# Armazenamento local dos datasets importados em formato Arrow IPC (Feather v2),
+# uma pasta por hash do conteúdo com um arquivo por DataFrame ('df_vol.arrow', ...).
+# Os arquivos são gravados sem compressão para serem lidos com memory map.
+PATH = pathlib.Path(__file__).parent
+CACHE_PATH = pathlib.Path(os.environ.get('MADEIRA_CACHE_DIR', PATH.joinpath('../cache'))).resolve()
+
+# Espaço máximo em disco (em MB) dos datasets armazenados, configurável pela
+# variável de ambiente. Acima dele as pastas usadas há mais tempo (data de
+# modificação, atualizada a cada leitura) são removidas.
+LIMITE_MB = float(os.environ.get('MADEIRA_CACHE_MB', 2048))
+
+# A chave vem do navegador; apenas hashes sha256 viram nomes de pasta
+_CHAVE = re.compile(r'[0-9a-f]{64}')
+
+
+def _pasta(chave):
+    if not isinstance(chave, str) or not _CHAVE.fullmatch(chave):
+        raise ValueError(f'Chave de dataset inválida: {chave!r}')
+    return CACHE_PATH.joinpath(chave)
+
+
+def existe(chave):
+    try:
+        return _pasta(chave).is_dir()
+    except ValueError:
+        return False
+
+
+# Grava o dataset em uma pasta temporária e a renomeia ao final, para que
+# uma pasta existente esteja sempre completa
+def salvar(chave, dataset):
+    destino = _pasta(chave)
+    if destino.is_dir():
+        return
+    temporaria = CACHE_PATH.joinpath(f'.{chave}.{os.getpid()}.tmp')
+    temporaria.mkdir(parents=True, exist_ok=True)
+    try:
+        for nome, df in dataset.items():
+            feather.write_feather(df, temporaria.joinpath(f'{nome}.arrow'), compression='uncompressed')
+        os.replace(temporaria, destino)
+    except OSError:
+        # Outro processo gravou o mesmo dataset primeiro
+        shutil.rmtree(temporaria, ignore_errors=True)
+        if not destino.is_dir():
+            raise
+
+
+def _tamanho(pasta):
+    return sum(arquivo.stat().st_size for arquivo in pasta.iterdir() if arquivo.is_file())
+
+
+# Remove as pastas usadas há mais tempo até o armazenamento caber em
+# LIMITE_MB, sem tocar nas chaves de `manter` (datasets em uso). Arquivos
+# abertos com memory map por outros processos continuam legíveis até serem
+# fechados.
+def liberar_espaco(manter=()):
+    if not CACHE_PATH.is_dir():
+        return
+    pastas = []
+    for pasta in CACHE_PATH.iterdir():
+        if pasta.is_dir() and _CHAVE.fullmatch(pasta.name):
+            try:
+                pastas.append((pasta.stat().st_mtime, _tamanho(pasta), pasta))
+            except FileNotFoundError:
+                # Removida por outro processo durante a varredura
+                continue
+    total = sum(tamanho for _, tamanho, _ in pastas)
+    limite = LIMITE_MB * 1024 * 1024
+    for _, tamanho, pasta in sorted(pastas, key=lambda item: item[0]):
+        if total <= limite:
+            break
+        if pasta.name in manter:
+            continue
+        shutil.rmtree(pasta, ignore_errors=True)
+        total -= tamanho
+
+
+# Reabre o dataset com memory map; retorna None se não estiver armazenado
+def carregar(chave):
+    if not existe(chave):
+        return None
+    # Marca o uso para a ordem de remoção de liberar_espaco
+    try:
+        os.utime(_pasta(chave), (time.time(), time.time()))
+    except FileNotFoundError:
+        return None
+    return {arquivo.stem: feather.read_table(arquivo, memory_map=True).to_pandas()
+            for arquivo in sorted(_pasta(chave).glob('*.arrow'))}
@@ -0,0 +1,67 @@
+import functools
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import plotly.graph_objs as go
+
+import registro
+import serializacao
+
+# Cache LRU das figuras geradas pelos callbacks, chaveado por
+# (dataset, página, callback, entradas). Um acerto devolve a figura já
+# convertida em dicionário (com os vetores numéricos já compactados por
+# serializacao), sem refazer os cálculos no pandas nem montar e validar o
+# go.Figure novamente.
+
+# Quantidade máxima de figuras no cache, configurável pela variável de ambiente
+TAMANHO = int(os.environ.get('MADEIRA_CACHE_FIGURAS', 256))
+
+_figuras = OrderedDict()
+_contadores = {'acertos': 0, 'falhas': 0}
+_lock = threading.Lock()
+
+
+# Reduz o clickData ao que identifica o ponto clicado; posição do mouse e
+# demais campos não mudam a figura
+def _normalizar(valor):
+    if isinstance(valor, dict) and 'points' in valor:
+        return [[ponto.get('pointIndex'), ponto.get('x')] for ponto in valor['points']]
+    return valor
+
+
+# Decorador dos callbacks de figura. O último argumento do callback deve ser o
+# conteúdo do dcc.Store; a figura é chaveada pelo dataset que ele resolve
+# (registro.resolver), o mesmo que o callback lê, e não pelo que está escrito
+# no Store: sessões com o marcador do dataset padrão passam a outra entrada
+# quando o padrão muda.
+def memorizar(funcao):
+    @functools.wraps(funcao)
+    def envolvida(*args):
+        dataset = registro.resolver(args[-1])
+        if dataset is None:
+            return funcao(*args)
+        chave = (dataset, funcao.__module__, funcao.__name__,
+                 json.dumps([_normalizar(valor) for valor in args[:-1]], default=str))
+        with _lock:
+            figura = _figuras.get(chave)
+            if figura is not None:
+                _figuras.move_to_end(chave)
+                _contadores['acertos'] += 1
+                return figura
+            _contadores['falhas'] += 1
+        figura = funcao(*args)
+        if isinstance(figura, go.Figure):
+            figura = serializacao.compactar(figura.to_dict())
+        with _lock:
+            _figuras[chave] = figura
+            while len(_figuras) > TAMANHO:
+                _figuras.popitem(last=False)
+        return figura
+    return envolvida
+
+
+def estatisticas():
+    with _lock:
+        return dict(_contadores, tamanho=len(_figuras), capacidade=TAMANHO)
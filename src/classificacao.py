@@ -0,0 +1,152 @@
+import functools
+import os
+import re
+import unicodedata
+
+import pandas as pd
+
+# Classificação das descrições dos produtos (ex.: "angelim linha 5x11cm 3mt")
+# em espécie (MADEIRA_NOME) e apresentação (APRESENTACAO_NOME). As palavras da
+# descrição são procuradas primeiro de forma exata no vocabulário e, se nenhuma
+# casar, de forma aproximada pela distância de Levenshtein, consultando uma
+# árvore BK em vez de comparar com cada termo do vocabulário.
+
+COLUNA_DESCRICAO = 'DESCRICAO'
+
+ESPECIES = ['amescla', 'andiroba', 'angelim', 'cambará', 'cedrinho', 'cedro', 'cumaru', 'cupiúba', 'eucalipto',
+            'freijó', 'garapeira', 'ipê', 'itaúba', 'jatobá', 'jequitibá', 'louro', 'maçaranduba', 'mogno',
+            'muiracatiara', 'pequiá', 'peroba', 'pinus', 'roxinho', 'sucupira', 'tatajuba', 'tauari']
+APRESENTACOES = ['assoalho', 'barrote', 'batente', 'caibro', 'deck', 'forro', 'lambri', 'linha', 'mourão',
+                 'pontalete', 'prancha', 'pranchão', 'ripa', 'rodapé', 'sarrafo', 'tábua', 'taco', 'viga', 'vigota']
+# Outras grafias e nomes populares -> nome do vocabulário
+SINONIMOS = {
+    'massaranduba': 'maçaranduba',
+    'pau d arco': 'ipê',
+    'garapa': 'garapeira',
+    'angelim pedra': 'angelim',
+    'angelim vermelho': 'angelim',
+    'cedro rosa': 'cedro',
+    'louro vermelho': 'louro',
+    'pinho': 'pinus',
+    'lambril': 'lambri',
+    'moirao': 'mourão',
+}
+
+# Palavras mais curtas que isso não entram na busca aproximada (unidades,
+# abreviações e preposições gerariam falsos positivos)
+TAMANHO_MINIMO = 4
+# Descrições distintas guardadas no cache de classificação
+TAMANHO_MEMO = int(os.environ.get('MADEIRA_MEMO_CLASSIFICACAO', 100_000))
+
+
+def normalizar(texto):
+    texto = unicodedata.normalize('NFKD', str(texto).lower())
+    return ''.join(caractere for caractere in texto if not unicodedata.combining(caractere))
+
+
+def levenshtein(a, b):
+    if len(a) < len(b):
+        a, b = b, a
+    anterior = list(range(len(b) + 1))
+    for i, caractere_a in enumerate(a, 1):
+        atual = [i]
+        for j, caractere_b in enumerate(b, 1):
+            atual.append(min(anterior[j] + 1, atual[j - 1] + 1, anterior[j - 1] + (caractere_a != caractere_b)))
+        anterior = atual
+    return anterior[-1]
+
+
+# Árvore BK: cada filho fica na aresta com a sua distância ao pai, e a busca
+# só desce pelas arestas em [d - tolerância, d + tolerância] (desigualdade
+# triangular), descartando a maior parte do vocabulário sem calcular distâncias
+class ArvoreBK:
+    def __init__(self, termos=()):
+        self.raiz = None
+        for termo in termos:
+            self.adicionar(termo)
+
+    def adicionar(self, termo):
+        if self.raiz is None:
+            self.raiz = (termo, {})
+            return
+        no = self.raiz
+        while True:
+            distancia = levenshtein(termo, no[0])
+            if distancia == 0:
+                return
+            if distancia not in no[1]:
+                no[1][distancia] = (termo, {})
+                return
+            no = no[1][distancia]
+
+    # Termos a no máximo `tolerancia` de distância, do mais próximo ao mais distante
+    def buscar(self, termo, tolerancia):
+        encontrados = []
+        pendentes = [self.raiz] if self.raiz is not None else []
+        while pendentes:
+            candidato, filhos = pendentes.pop()
+            distancia = levenshtein(termo, candidato)
+            if distancia <= tolerancia:
+                encontrados.append((distancia, candidato))
+            pendentes.extend(filho for aresta, filho in filhos.items()
+                             if distancia - tolerancia <= aresta <= distancia + tolerancia)
+        return sorted(encontrados)
+
+
+class Vocabulario:
+    def __init__(self, nomes, sinonimos):
+        # Forma normalizada (sem acentos, minúscula) -> nome do vocabulário
+        self.termos = {normalizar(nome): nome for nome in nomes}
+        self.termos.update({normalizar(sinonimo): nome for sinonimo, nome in sinonimos.items() if nome in nomes})
+        self.palavras_por_termo = max(len(termo.split()) for termo in self.termos)
+        self.arvore = ArvoreBK(self.termos)
+
+    # Termos de uma ou mais palavras da descrição, na ordem em que aparecem,
+    # preferindo os mais longos
+    def _candidatos(self, palavras):
+        for inicio in range(len(palavras)):
+            for tamanho in range(min(self.palavras_por_termo, len(palavras) - inicio), 0, -1):
+                yield ' '.join(palavras[inicio:inicio + tamanho])
+
+    def procurar(self, palavras):
+        candidatos = list(self._candidatos(palavras))
+        for candidato in candidatos:
+            if candidato in self.termos:
+                return self.termos[candidato]
+        melhor = None
+        for candidato in candidatos:
+            if len(candidato) < TAMANHO_MINIMO:
+                continue
+            tolerancia = 1 if len(candidato) <= 6 else 2
+            encontrados = self.arvore.buscar(candidato, tolerancia)
+            if encontrados and (melhor is None or encontrados[0][0] < melhor[0]):
+                melhor = encontrados[0]
+        return None if melhor is None else self.termos[melhor[1]]
+
+
+_especies = Vocabulario(ESPECIES, SINONIMOS)
+_apresentacoes = Vocabulario(APRESENTACOES, SINONIMOS)
+
+
+# (espécie, apresentação) de uma descrição; None quando não há correspondência.
+# Descrições repetidas (comuns nas notas fiscais) são respondidas pelo cache.
+@functools.lru_cache(maxsize=TAMANHO_MEMO)
+def classificar(descricao):
+    palavras = re.findall(r'[a-z]+', normalizar(descricao))
+    return _especies.procurar(palavras), _apresentacoes.procurar(palavras)
+
+
+# Preenche MADEIRA_NOME e APRESENTACAO_NOME a partir da coluna DESCRICAO quando o
+# CSV traz as descrições brutas em vez dos nomes já classificados; a descrição
+# não é mantida no dataset. Cada descrição distinta do bloco é classificada
+# uma única vez.
+def completar(df):
+    if COLUNA_DESCRICAO not in df or {'MADEIRA_NOME', 'APRESENTACAO_NOME'} <= set(df.columns):
+        return df
+    codigos, descricoes = pd.factorize(df[COLUNA_DESCRICAO])
+    classes = [classificar(descricao) for descricao in descricoes]
+    especies = pd.Series([especie for especie, _ in classes] + [None], dtype=object)
+    apresentacoes = pd.Series([apresentacao for _, apresentacao in classes] + [None], dtype=object)
+    # Código -1 (descrição vazia) aponta para o None acrescentado no fim
+    return df.drop(columns=COLUNA_DESCRICAO).assign(MADEIRA_NOME=especies.to_numpy()[codigos],
+                                                    APRESENTACAO_NOME=apresentacoes.to_numpy()[codigos])
@@ -0,0 +1,109 @@
+import itertools
+import os
+import tempfile
+
+import sob_demanda
+
+pa = sob_demanda.importar('pyarrow')
+pq = sob_demanda.importar('pyarrow.parquet')
+xlsxwriter = sob_demanda.importar('xlsxwriter')
+
+# Exportação de tabelas (pauta fiscal) em CSV, Parquet ou XLSX como geradores
+# de bytes, para o Flask enviar a resposta em partes. A tabela chega como uma
+# sequência de partes (DataFrames com as mesmas colunas, ao menos uma), e cada
+# formato escreve as partes em fatias de até LINHAS_POR_PARTE linhas e entrega
+# os bytes de cada fatia assim que ficam prontos, sem montar o arquivo inteiro
+# em memória.
+LINHAS_POR_PARTE = 50_000
+# Bytes lidos por vez do arquivo temporário do XLSX
+BLOCO_ARQUIVO = 1024 * 1024
+
+
+def _fatias(partes):
+    for parte in partes:
+        for inicio in range(0, len(parte), LINHAS_POR_PARTE):
+            yield parte.iloc[inicio:inicio + LINHAS_POR_PARTE]
+
+
+# A primeira parte e o iterador com todas as partes
+def _primeira(partes):
+    partes = iter(partes)
+    primeira = next(partes)
+    return primeira, itertools.chain([primeira], partes)
+
+
+def gerar_csv(partes):
+    primeira, partes = _primeira(partes)
+    yield primeira.iloc[:0].to_csv(index=False).encode('utf-8')
+    for fatia in _fatias(partes):
+        yield fatia.to_csv(index=False, header=False).encode('utf-8')
+
+
+# Destino de escrita que acumula os bytes até o gerador entregá-los
+class _Saida:
+    def __init__(self):
+        self.pendente = bytearray()
+        self.posicao = 0
+        self.closed = False
+
+    def write(self, dados):
+        self.pendente += dados
+        self.posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self.posicao
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def retirar(self):
+        dados, self.pendente = bytes(self.pendente), bytearray()
+        return dados
+
+
+# Cada fatia vira um row group do Parquet, com o esquema da primeira parte
+def gerar_parquet(partes):
+    primeira, partes = _primeira(partes)
+    saida = _Saida()
+    esquema = pa.Schema.from_pandas(primeira, preserve_index=False)
+    with pq.ParquetWriter(saida, esquema) as escritor:
+        for fatia in _fatias(partes):
+            escritor.write_table(pa.Table.from_pandas(fatia, schema=esquema, preserve_index=False))
+            yield saida.retirar()
+    yield saida.retirar()
+
+
+# O XLSX é um zip montado ao fechar o arquivo, então é gravado em um arquivo
+# temporário (com constant_memory, que descarrega cada linha em disco) e
+# enviado em blocos: o primeiro byte só sai depois de escrita a última parte
+def gerar_xlsx(partes):
+    primeira, partes = _primeira(partes)
+    descritor, caminho = tempfile.mkstemp(suffix='.xlsx')
+    os.close(descritor)
+    try:
+        livro = xlsxwriter.Workbook(caminho, {'constant_memory': True, 'nan_inf_to_errors': True})
+        planilha = livro.add_worksheet()
+        planilha.write_row(0, 0, list(primeira.columns))
+        linha = 1
+        for fatia in _fatias(partes):
+            for valores in fatia.itertuples(index=False):
+                planilha.write_row(linha, 0, valores)
+                linha += 1
+        livro.close()
+        with open(caminho, 'rb') as arquivo:
+            while bloco := arquivo.read(BLOCO_ARQUIVO):
+                yield bloco
+    finally:
+        os.remove(caminho)
+
+
+# Formato -> (gerador, tipo MIME)
+FORMATOS = {
+    'csv': (gerar_csv, 'text/csv'),
+    'parquet': (gerar_parquet, 'application/vnd.apache.parquet'),
+    'xlsx': (gerar_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
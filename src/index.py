@@ -1,22 +1,47 @@
 import dash
 from dash import dcc, html, Input, Output, State
-import base64
-import io
 import datetime
+import hashlib
+import hmac
+import json
+import os
+import time
+import urllib.parse
 from dash.exceptions import PreventUpdate
-import pandas as pd
+from flask import Response, abort, jsonify, request
 
 # Connect to main app.py file
 from app import app
+import registro
+import ingestao
+import cache_figuras
+import metricas
+import agregados
+import exportacao
+import padrao
 
 # Connect to your app pages
 from apps import volume_vendido, preco_volume, area_vendida, preco_area
+
+# Links de navegação
+LINKS = [
+    ('Início', '/'),
+    ('Volume Vendido', '/apps/volume_vendido'),
+    ('Preço Médio Volume', '/apps/preco_volume'),
+    ('Área Vendida', '/apps/area_vendida'),
+    ('Preço Médio Área', '/apps/preco_area')
+]
+
 # Layout da aplicação
 app.layout = html.Div([
     html.Div("Tributação de Produtos de Madeira Serrada no RN", className="titulo"),
     dcc.Location(id='url', refresh=False),
-    dcc.Store(id='data-store', storage_type='memory'),
-    html.Div(id='nav-links', className="row"),
+    dcc.Store(id='data-store', storage_type='local'),
+    # Nome do arquivo recebido pelo upload, à espera da tarefa de importação
+    dcc.Store(id='upload-recebido'),
+    html.Div([dcc.Link(link_text, href=link_href, id=f'nav-link-{idx}', className='nav-link ')
+              for idx, (link_text, link_href) in enumerate(LINKS)],
+             id='nav-links', className="row"),
     html.Div([
         html.P('A classificação de produtos de madeira é um grande desafio devido à falta de padronização nas descrições dos produtos. No entanto, esse processo é imprescindível para projetos subsequentes, como o cálculo de preço médio e pauta fiscal.'),
         html.P('O objetivo deste projeto foi classificar os produtos de madeira em dois níveis específicos: espécie e apresentação, além de calcular o volume dos produtos classificados.'),
@@ -32,82 +57,353 @@ app.layout = html.Div([
             ]),
             className="upload",
             # Allow multiple files to be uploaded
-            multiple=False)
+            multiple=False),
+        dcc.Checklist(
+            id='modo-upload',
+            options=[{'label': 'Acrescentar ao dataset já importado (novos períodos)', 'value': 'acrescentar'}],
+            value=[])
     ],id='principal', className="row"),
 
+    html.Div(id='progresso-upload', style={'display': 'none'}),
     html.Div(id='output-data-upload'),
     html.Div(id='page-content', children=[])
 ])
 
 
-@app.callback(
-    Output('nav-links', 'children'),
+# Atualiza a classe dos links de navegação no navegador, marcando a página atual
+app.clientside_callback(
+    """
+    function(pathname) {
+        return %s.map(function(href) {
+            return 'nav-link ' + (pathname === href ? 'active' : '');
+        });
+    }
+    """ % json.dumps([link_href for link_text, link_href in LINKS]),
+    [Output(f'nav-link-{idx}', 'className') for idx in range(len(LINKS))],
     [Input('url', 'pathname')]
 )
-def update_nav_links(pathname):
-    links = [
-        ('Início', '/'),
-        ('Volume Vendido', '/apps/volume_vendido'),
-        ('Preço Médio Volume', '/apps/preco_volume'),
-        ('Área Vendida', '/apps/area_vendida'),
-        ('Preço Médio Área', '/apps/preco_area')
-    ]
-    nav_links = []
-    for link_text, link_href in links:
-        active_class = 'active' if pathname == link_href else ''
-        nav_links.append(
-            dcc.Link(
-                link_text,
-                href=link_href,
-                className=f"nav-link {active_class}"
-            )
-        )
-    return nav_links
 
 
+# Recebe o upload e grava o CSV decodificado em disco. A tarefa de importação
+# recebe apenas o nome do envio: as entradas de um callback em segundo plano
+# são reenviadas pelo navegador a cada consulta do andamento, e com o
+# conteúdo em base64 entre elas o arquivo inteiro seria transmitido e lido de
+# novo a cada segundo. O conteúdo do dcc.Upload é limpo em seguida.
 @app.callback(
-    [Output('output-data-upload', 'children'),
-     Output('data-store', 'data')],
+    [Output('upload-recebido', 'data'),
+     Output('upload-data', 'contents')],
     [Input('upload-data', 'contents')],
     [State('upload-data', 'filename'),
-     State('upload-data', 'last_modified'),
-     State('data-store', 'data')]
+     State('upload-data', 'last_modified')],
+    prevent_initial_call=True
 )
-def update_output(content, filename, date, stored_data):
+def receber_upload(content, filename, date):
     if content is None:
         raise PreventUpdate
+    return {'envio': ingestao.guardar_upload(content), 'filename': filename, 'date': date}, None
+
+
+@app.callback(
+    [Output('output-data-upload', 'children'),
+     Output('data-store', 'data')],
+    [Input('upload-recebido', 'data')],
+    [State('modo-upload', 'value'),
+     State('data-store', 'data')],
+    # A importação roda como tarefa em segundo plano, liberando o servidor web
+    # para os demais callbacks enquanto o CSV é processado
+    background=True,
+    progress=[Output('progresso-upload', 'children')],
+    running=[(Output('progresso-upload', 'style'), {'display': 'block'}, {'display': 'none'}),
+             (Output('upload-data', 'disabled'), True, False)]
+)
+def update_output(set_progress, recebido, modo, stored_data):
+    envio = (recebido or {}).get('envio')
+    if ingestao.hash_envio(envio) is None:
+        raise PreventUpdate
     else:
-        content_type, content_string = content.split(',')
-        decoded = base64.b64decode(content_string)
-        # Assuming that the user uploads a CSV file
-        df = pd.read_csv(io.StringIO(decoded.decode('utf-8')))
-        # Convertendo a coluna 'NUMEROS' e 'PROFUNDIDADE' para listas
-        df['NUMEROS'] = df['NUMEROS'].apply(lambda x: [float(num) for num in x.strip('[]').split(',')])
-        df['PROFUNDIDADE'] = df['PROFUNDIDADE'].apply(lambda x: [float(num) for num in str(x).strip('[]').split(',') if num.strip()])
-        df_vol = df[(df['NUMEROS'].str.len() > 2) | (df['PROFUNDIDADE'].str.len() > 0)]
-        df_area = df[(df['NUMEROS'].str.len() <= 2) & (df['PROFUNDIDADE'].str.len() <= 0)]
-        # Inicializar stored_data como um dicionário vazio se estiver vazio
-        if not stored_data:
-            stored_data = {}
-        
-        # Converter df_vol para uma lista de dicionários antes de armazenar
-        stored_data['df_vol'] = df_vol.to_dict('records')
-        stored_data['df_area'] = df_area.to_dict('records')
+        filename, date = recebido['filename'], recebido['date']
+        try:
+            # No modo de acréscimo o dataset atual é mantido e recebe só as linhas novas do arquivo
+            anterior = chave_anterior = None
+            if 'acrescentar' in (modo or []):
+                chave_anterior = registro.resolver(stored_data)
+                anterior = registro.obter_dataset(chave_anterior) if chave_anterior else None
+            # Um arquivo idêntico a um já importado é reaberto sem novo processamento
+            chave = ingestao.hash_envio(envio)
+            if anterior is not None:
+                chave = hashlib.sha256((chave_anterior + chave).encode()).hexdigest()
+            dataset = registro.obter_dataset(chave)
+            reimportado = dataset is not None
+            duplicadas = 0
+            if not reimportado:
+                # Leitura do CSV gravado pelo upload, em blocos
+                set_progress((html.H6('Processando arquivo...'),))
+                try:
+                    dataset = ingestao.ler_envio(
+                        envio, lambda linhas: set_progress((html.H6(f'{linhas} linhas processadas'),)))
+                except (ValueError, OSError, EOFError) as erro:
+                    # Arquivo inválido (ex.: sem as colunas obrigatórias): o
+                    # motivo é mostrado e o dataset da sessão não muda
+                    return (html.Div([html.H5(f'{filename}: não foi possível importar o arquivo. {erro}')]),
+                            dash.no_update)
+                if anterior is not None:
+                    dataset, duplicadas = ingestao.acrescentar(anterior, dataset)
+        finally:
+            ingestao.remover_envio(envio)
+        # Registrar os dados no servidor; o dcc.Store guarda apenas a chave do dataset.
+        # A versão anterior ao acréscimo não é apagada: a chave é o hash do
+        # conteúdo e pode estar em uso por outras sessões, links ?dataset= e
+        # pela API. Sem uso, ela sai do disco pelo limite de
+        # armazenamento.LIMITE_MB, a partir da usada há mais tempo.
+        stored_data = registro.registrar(chave, dataset)
         
-        mais_antigo = df.sort_values(by='SK_DATA')['SK_DATA'].iloc[0]
-        mais_recente = df.sort_values(by='SK_DATA')['SK_DATA'].iloc[-1]
+        mais_antigo, mais_recente = ingestao.periodo(dataset)
         # Converter o objeto datetime para uma string antes de retorná-lo
         formatted_date = datetime.datetime.fromtimestamp(date).strftime('%Y-%m-%d %H:%M:%S')
         
         return (
             html.Div([
-                html.H5(filename + f' Upload finalizado com sucesso. Dados de {mais_antigo} a {mais_recente}'),
+                html.H5(filename + f' Upload finalizado com sucesso. Dados de {mais_antigo} a {mais_recente}'
+                        + (' (arquivo já importado anteriormente)' if reimportado else '')
+                        + (f' ({duplicadas} linhas já importadas ignoradas)' if duplicadas else '')),
                 html.H6(formatted_date),
+                html.Div(['Pauta fiscal (preço médio por espécie, apresentação e mês): ']
+                         + [html.A(formato.upper(), href=f"/exportar/pauta-fiscal/{stored_data['dataset']}.{formato}",
+                                   download=f'pauta_fiscal.{formato}', style={'margin-right': '8px'})
+                            for formato in exportacao.FORMATOS]),
             ]),
             stored_data
         )
 
 
+# Contadores de acertos e falhas do cache de figuras
+@app.server.route('/estatisticas/cache-figuras')
+def estatisticas_cache_figuras():
+    return jsonify(cache_figuras.estatisticas())
+
+
+# Pauta fiscal de todas as combinações do dataset, enviada em partes no formato pedido
+@app.server.route('/exportar/pauta-fiscal/<chave>.<formato>')
+def exportar_pauta_fiscal(chave, formato):
+    if formato not in exportacao.FORMATOS:
+        abort(404)
+    try:
+        dataset = registro.obter_dataset(chave)
+    except ValueError:
+        abort(404)
+    if dataset is None:
+        abort(404)
+    gerar, mimetype = exportacao.FORMATOS[formato]
+    return Response(gerar(agregados.pauta_fiscal(dataset)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=pauta_fiscal.{formato}'})
+
+
+# Token compartilhado das rotas de carga (importação e recarga do dataset
+# padrão), enviado no cabeçalho "Authorization: Bearer <token>". Sem a
+# variável definida essas rotas ficam desativadas.
+TOKEN_IMPORTACAO = os.environ.get('MADEIRA_TOKEN_IMPORTACAO', '')
+
+
+# Resposta de erro se a requisição não traz o token; None se traz
+def _recusar_sem_token():
+    if not TOKEN_IMPORTACAO:
+        return jsonify({'erro': 'Rota desativada: defina MADEIRA_TOKEN_IMPORTACAO'}), 403
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode(),
+                               f'Bearer {TOKEN_IMPORTACAO}'.encode()):
+        return jsonify({'erro': 'Token ausente ou inválido'}), 401
+    return None
+
+
+# Importação em lote para a carga noturna: o CSV (puro ou gzip) vem no corpo
+# da requisição e é lido em fluxo, sem o base64 do dcc.Upload, com o mesmo
+# processamento de update_output. O dataset fica disponível nos painéis pelo
+# link devolvido em 'painel'. O corpo é limitado por MAX_CONTENT_LENGTH
+# (src/app.py) e o CSV descomprimido por ingestao.LIMITE_DESCOMPRIMIDO_MB.
+# Uso: curl -H "Authorization: Bearer $MADEIRA_TOKEN_IMPORTACAO" \
+#           --data-binary @notas.csv.gz http://servidor/importar/csv
+@app.server.route('/importar/csv', methods=['POST'])
+def importar_csv():
+    if (recusa := _recusar_sem_token()) is not None:
+        return recusa
+    inicio = time.perf_counter()
+    lidas = [0]
+    try:
+        chave, dataset = ingestao.ler_fluxo(request.stream, lambda linhas: lidas.__setitem__(0, linhas))
+    except ingestao.ArquivoGrandeDemais as erro:
+        return jsonify({'erro': str(erro)}), 413
+    except (ValueError, OSError, EOFError) as erro:
+        return jsonify({'erro': str(erro)}), 400
+    registro.registrar(chave, dataset)
+    segundos = time.perf_counter() - inicio
+    metricas.registrar_importacao(lidas[0], request.content_length or 0, segundos)
+    mais_antigo, mais_recente = ingestao.periodo(dataset)
+    return jsonify({
+        'dataset': chave,
+        'linhas': lidas[0],
+        'linhas_volume': len(dataset['df_vol']),
+        'linhas_area': len(dataset['df_area']),
+        'periodo': [str(mais_antigo), str(mais_recente)],
+        'segundos': round(segundos, 3),
+        'linhas_por_segundo': round(lidas[0] / segundos) if segundos else None,
+        'painel': f'/?dataset={chave}',
+    })
+
+
+# API de consulta dos agregados mostrados nos painéis. A chave do dataset é o
+# hash do conteúdo, então a resposta de uma mesma consulta nunca muda: o ETag
+# vem da chave e dos parâmetros, e um If-None-Match igual recebe 304 sem
+# carregar o dataset. O Flask-Compress acrescenta ao ETag de uma resposta
+# comprimida o algoritmo usado ("<hash>:gzip"), e é essa forma que o cliente
+# devolve no If-None-Match.
+ALGORITMOS_COMPRESSAO = ('gzip', 'br', 'zstd', 'deflate')
+
+
+def _etag(*partes):
+    return hashlib.sha256(json.dumps(partes, sort_keys=True).encode()).hexdigest()
+
+
+def _responder_json(etag, calcular):
+    variantes = [etag] + [f'{etag}:{algoritmo}' for algoritmo in ALGORITMOS_COMPRESSAO]
+    enviado = next((variante for variante in variantes if variante in request.if_none_match), None)
+    if enviado is not None:
+        resposta = Response(status=304)
+        resposta.set_etag(enviado)
+    else:
+        resposta = calcular()
+        resposta.set_etag(etag)
+    resposta.headers['Cache-Control'] = 'public, max-age=3600'
+    return resposta
+
+
+def _obter_dataset_api(chave):
+    try:
+        dataset = registro.obter_dataset(chave)
+    except ValueError:
+        abort(404)
+    if dataset is None:
+        abort(404)
+    return dataset
+
+
+def _lista_parametro(nome, valores_padrao=()):
+    valores = [valor for texto in request.args.getlist(nome) for valor in texto.split(',') if valor]
+    return valores or list(valores_padrao)
+
+
+# Data AAAA-MM, AAAAMM, AAAA-MM-DD ou AAAAMMDD como inteiro AAAAMM ou AAAAMMDD
+def _data_parametro(nome):
+    texto = request.args.get(nome)
+    if not texto:
+        return None
+    digitos = texto.replace('-', '')
+    if not digitos.isdigit() or len(digitos) not in (6, 8):
+        raise ValueError(f'Data inválida em {nome}: {texto}')
+    return int(digitos)
+
+
+# Espécies, apresentações e período de cada parte do dataset, para montar as consultas
+@app.server.route('/api/<chave>')
+def api_catalogo(chave):
+    def calcular():
+        dataset = _obter_dataset_api(chave)
+        mais_antigo, mais_recente = ingestao.periodo(dataset)
+        return jsonify({
+            'dataset': chave,
+            'periodo': [str(mais_antigo), str(mais_recente)],
+            'partes': {sufixo: {'unidade': unidade,
+                                'especies': sorted(dataset[f'cubo_{sufixo}']['MADEIRA_NOME'].cat.categories),
+                                'apresentacoes': sorted(dataset[f'cubo_{sufixo}']['APRESENTACAO_NOME'].cat.categories)}
+                       for sufixo, unidade in agregados.UNIDADES.items()},
+        })
+    return _responder_json(_etag(chave), calcular)
+
+
+# Agregados de uma parte ('vol' ou 'area'). Parâmetros: por (especie,
+# apresentacao, periodo), metrica (quantidade, valor, preco, notas), especie e
+# apresentacao (nomes, repetidos ou separados por vírgula), inicio e fim
+# (AAAA-MM ou AAAA-MM-DD) e granularidade (dia, mes, trimestre, ano).
+# Ex.: /api/<chave>/vol?por=periodo&metrica=preco&especie=angelim&apresentacao=viga
+@app.server.route('/api/<chave>/<parte>')
+def api_agregados(chave, parte):
+    if parte not in agregados.UNIDADES:
+        abort(404)
+    try:
+        por = _lista_parametro('por')
+        escolhidas = _lista_parametro('metrica', agregados.METRICAS_CONSULTA)
+        invalidos = ([valor for valor in por if valor not in agregados.DIMENSOES_CONSULTA]
+                     + [valor for valor in escolhidas if valor not in agregados.METRICAS_CONSULTA])
+        if invalidos:
+            raise ValueError(f'Parâmetros inválidos: {", ".join(invalidos)}')
+        consulta = {'por': list(dict.fromkeys(por)), 'metricas': list(dict.fromkeys(escolhidas)),
+                    'especies': _lista_parametro('especie'), 'apresentacoes': _lista_parametro('apresentacao'),
+                    'inicio': _data_parametro('inicio'), 'fim': _data_parametro('fim'),
+                    'granularidade': request.args.get('granularidade', 'mes')}
+        if consulta['granularidade'] not in agregados.GRANULARIDADES:
+            raise ValueError(f'Granularidade inválida: {consulta["granularidade"]}')
+    except ValueError as erro:
+        return jsonify({'erro': str(erro)}), 400
+
+    def calcular():
+        resultado = agregados.consultar(_obter_dataset_api(chave), parte, **consulta)
+        # NaN e ±inf (preço sem volume) viram null no JSON, que não tem Infinity
+        resultado = resultado.replace([float('inf'), float('-inf')], float('nan'))
+        registros = resultado.astype(object).where(resultado.notna(), None).to_dict('records')
+        return jsonify({'dataset': chave, 'parte': parte, 'unidade': agregados.UNIDADES[parte],
+                       'consulta': consulta, 'dados': registros})
+    return _responder_json(_etag(chave, parte, consulta), calcular)
+
+
+# Abre nos painéis um dataset já registrado (por exemplo, importado pela API)
+# a partir do parâmetro ?dataset=<chave> do endereço. Sem o parâmetro, uma
+# sessão sem dataset (ou com um que não existe mais) recebe o marcador do
+# dataset padrão (registro.PADRAO), resolvido a cada leitura.
+@app.callback(Output('data-store', 'data', allow_duplicate=True),
+              Input('url', 'search'),
+              State('data-store', 'data'),
+              prevent_initial_call='initial_duplicate')
+def abrir_dataset(search, stored_data):
+    chave = urllib.parse.parse_qs((search or '').lstrip('?')).get('dataset', [None])[0]
+    if chave:
+        if not registro.existe(chave):
+            raise PreventUpdate
+        return {'dataset': chave}
+    stored_data = stored_data or {}
+    if stored_data.get('padrao') or registro.existe(stored_data.get('dataset')) or padrao.chave() is None:
+        raise PreventUpdate
+    return dict(registro.PADRAO)
+
+
+# Dataset padrão (o arquivo mais recente da pasta datasets/) e a recarga
+# depois que um arquivo novo é copiado para a pasta. Cada processo de trabalho
+# também verifica a pasta sozinho a cada padrao.INTERVALO segundos. A recarga
+# exige o token de importação (TOKEN_IMPORTACAO).
+@app.server.route('/datasets/padrao')
+def dataset_padrao():
+    return jsonify(padrao.estado())
+
+
+@app.server.route('/datasets/padrao/recarregar', methods=['POST'])
+def recarregar_dataset_padrao():
+    if (recusa := _recusar_sem_token()) is not None:
+        return recusa
+    try:
+        chave = padrao.carregar(forcar=True)
+    except (ValueError, OSError, EOFError) as erro:
+        return jsonify({'erro': str(erro)}), 400
+    if chave is None:
+        return jsonify(dict(padrao.estado(), erro='Nenhum arquivo CSV na pasta')), 404
+    return jsonify(padrao.estado())
+
+
+# Latência, bytes trafegados e erros de cada callback, no formato do Prometheus
+metricas.instrumentar(app.server)
+
+
+@app.server.route('/metrics')
+def exportar_metricas():
+    return Response(metricas.exportar(), mimetype='text/plain; version=0.0.4')
+
+
 @app.callback(Output('page-content', 'children'),
               Output('principal', 'style'),
               [Input('url', 'pathname')])
@@ -124,5 +420,14 @@ def display_page(pathname):
         return "",  {'display': 'block'}
 
 
+# Dataset padrão carregado na inicialização; com gunicorn --preload, antes do
+# fork. Com `python index.py`, o servidor de fork do pool de importação
+# (ingestao._CONTEXTO) importa este arquivo como __mp_main__, onde a carga não
+# se repete.
+if __name__ != '__mp_main__':
+    padrao.iniciar()
+
+server = app.server
+
 if __name__ == '__main__':
     app.run_server(debug=False)
@@ -0,0 +1,411 @@
+import base64
+import gzip
+import hashlib
+import io
+import itertools
+import multiprocessing
+import os
+import re
+import secrets
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import agregados
+import armazenamento
+import sob_demanda
+
+np = sob_demanda.importar('numpy')
+pd = sob_demanda.importar('pandas')
+# Vocabulário e tabela da NBR 14807 montados apenas na primeira importação
+classificacao = sob_demanda.importar('classificacao')
+medidas = sob_demanda.importar('medidas')
+
+# Linhas do CSV processadas por bloco durante a importação
+LINHAS_POR_BLOCO = int(os.environ.get('MADEIRA_LINHAS_POR_BLOCO', 200_000))
+# Processos que classificam e extraem as medidas dos blocos em paralelo
+# (padrão: núcleos disponíveis para o processo)
+_NUCLEOS = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+PROCESSOS = int(os.environ.get('MADEIRA_PROCESSOS', _NUCLEOS))
+# Caracteres base64 decodificados por vez (múltiplo de 4)
+BLOCO_BASE64 = 4 * 256 * 1024
+
+# Limite (em MB) do CSV descomprimido lido de um fluxo, contra arquivos gzip
+# que se expandem muito além do tamanho enviado
+LIMITE_DESCOMPRIMIDO_MB = float(os.environ.get('MADEIRA_LIMITE_CSV_MB', 8192))
+
+# Quantidade de colunas fixas geradas a partir de NUMEROS (padrão n x n x n)
+MAX_NUMEROS = 3
+# Colunas que todo CSV precisa ter, além dos nomes já classificados
+# (MADEIRA_NOME e APRESENTACAO_NOME) ou da descrição bruta (DESCRICAO)
+COLUNAS_OBRIGATORIAS = ['SK_DATA', 'NUMEROS', 'PROFUNDIDADE', 'VL_UNIT_COMERCIAL', 'COD_MODELO']
+COLUNAS_NOMES = ['MADEIRA_NOME', 'APRESENTACAO_NOME']
+
+
+# Arquivo maior que o limite de leitura
+class ArquivoGrandeDemais(ValueError):
+    pass
+
+
+# Rejeita um CSV sem as colunas necessárias antes de processar as linhas
+def verificar_colunas(colunas):
+    ausentes = [coluna for coluna in COLUNAS_OBRIGATORIAS if coluna not in colunas]
+    if not set(COLUNAS_NOMES) <= set(colunas) and classificacao.COLUNA_DESCRICAO not in colunas:
+        ausentes.append(f'{" e ".join(COLUNAS_NOMES)} (ou {classificacao.COLUNA_DESCRICAO})')
+    if ausentes:
+        raise ValueError(f'Colunas obrigatórias ausentes no CSV: {", ".join(ausentes)}')
+
+
+# Converte uma coluna de listas em texto ("[5.0, 11.0, 3.0]") em um vetor
+# numérico plano com todos os valores e nos offsets de início de cada linha.
+# As linhas são unidas em um único buffer e a contagem de valores por linha é
+# feita com numpy sobre os bytes, sem laço Python por linha.
+def parse_lista(coluna):
+    texto = coluna.astype(str)
+    dados = ('\n'.join(texto) + '\n').encode()
+    buffer = np.frombuffer(dados, dtype=np.uint8)
+    quebras = np.flatnonzero(buffer == ord('\n'))
+    inicios = np.concatenate(([0], quebras[:-1] + 1))
+    # Linha preenchida: possui algum byte diferente de espaço, vírgula, colchete e quebra de linha
+    valor = buffer != ord('\n')
+    for separador in b' ,[]':
+        valor &= buffer != separador
+    preenchida = np.logical_or.reduceat(valor, inicios)
+    virgulas = np.bincount(np.searchsorted(quebras, np.flatnonzero(buffer == ord(','))), minlength=len(texto))
+    contagem = np.where(preenchida, virgulas + 1, 0)
+    if not preenchida.any():
+        return np.empty(0), np.zeros(len(texto) + 1, dtype=np.int64)
+    if not preenchida.all():
+        dados = ('\n'.join(texto[preenchida]) + '\n').encode()
+    numeros = dados[:-1].replace(b'\n', b',').replace(b'[', b' ').replace(b']', b' ')
+    valores = np.fromstring(numeros, sep=',')
+    if len(valores) != contagem.sum():
+        raise ValueError(f'Coluna {coluna.name} contém valores que não são listas numéricas')
+    offsets = np.concatenate(([0], np.cumsum(contagem)))
+    return valores, offsets
+
+
+# Gera colunas de largura fixa (prefixo1, prefixo2, ...) a partir do vetor plano
+def _colunas_fixas(valores, offsets, quantidade):
+    contagem = np.diff(offsets)
+    colunas = []
+    for i in range(quantidade):
+        coluna = np.full(len(contagem), np.nan)
+        possui = contagem > i
+        coluna[possui] = valores[offsets[:-1][possui] + i]
+        colunas.append(coluna)
+    return colunas, contagem
+
+
+# Substitui NUMEROS e PROFUNDIDADE pelas colunas numéricas N1, N2, N3, N_COUNT,
+# PROF1 e PROF_COUNT
+def parse_numeros(df):
+    numeros, n_count = _colunas_fixas(*parse_lista(df['NUMEROS']), MAX_NUMEROS)
+    profundidade, prof_count = _colunas_fixas(*parse_lista(df['PROFUNDIDADE']), 1)
+    df = df.drop(columns=['NUMEROS', 'PROFUNDIDADE'])
+    for i, coluna in enumerate(numeros):
+        df[f'N{i + 1}'] = coluna
+    df['N_COUNT'] = n_count
+    df['PROF1'] = profundidade[0]
+    df['PROF_COUNT'] = prof_count
+    return df
+
+
+# Separa as linhas com volume (três números ou profundidade) das linhas com área
+def separar_vol_area(df):
+    mascara_vol = ((df['N_COUNT'] > 2) | (df['PROF_COUNT'] > 0)).to_numpy()
+    return df[mascara_vol], df[~mascara_vol]
+
+
+# Etapas de um bloco do CSV até a separação em volume e área. CSVs com as
+# descrições brutas são classificados e, sem a coluna VOLUME, o volume (ou a
+# área) é calculado pelas medidas; linhas fora da NBR 14807 são descartadas.
+def preparar(bloco):
+    df = parse_numeros(classificacao.completar(bloco))
+    if 'VOLUME' not in df:
+        df = medidas.calcular_volume(df)
+        df = df[df['VOLUME'].notna().to_numpy()]
+    return separar_vol_area(df)
+
+
+# Decodifica o conteúdo base64 do dcc.Upload em blocos de bytes, ignorando o
+# prefixo "data:text/csv;base64,"
+def _blocos_base64(conteudo):
+    for inicio in range(conteudo.index(',') + 1, len(conteudo), BLOCO_BASE64):
+        yield base64.b64decode(conteudo[inicio:inicio + BLOCO_BASE64])
+
+
+# Leitor binário que calcula o sha256 dos bytes à medida que são lidos, para
+# obter a chave de um arquivo recebido em fluxo sem lê-lo duas vezes
+class LeitorComHash(io.RawIOBase):
+    def __init__(self, fluxo):
+        self._fluxo = fluxo
+        self.resumo = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def readinto(self, destino):
+        dados = self._fluxo.read(len(destino))
+        destino[:len(dados)] = dados
+        self.resumo.update(dados)
+        return len(dados)
+
+
+# Leitor binário que interrompe a leitura com ArquivoGrandeDemais depois de
+# `limite` bytes
+class LeitorLimitado(io.RawIOBase):
+    def __init__(self, fluxo, limite):
+        self._fluxo = fluxo
+        self._restante = limite
+
+    def readable(self):
+        return True
+
+    def readinto(self, destino):
+        dados = self._fluxo.read(min(len(destino), self._restante + 1))
+        if len(dados) > self._restante:
+            raise ArquivoGrandeDemais(f'CSV maior que o limite de {LIMITE_DESCOMPRIMIDO_MB:g} MB')
+        self._restante -= len(dados)
+        destino[:len(dados)] = dados
+        return len(dados)
+
+
+# Cabeçalho dos arquivos gzip
+ASSINATURA_GZIP = b'\x1f\x8b'
+
+
+# Fluxo de bytes do CSV, descomprimindo-o se for gzip; a compressão é
+# reconhecida pelo cabeçalho do arquivo
+def _descomprimir(fluxo):
+    fluxo = io.BufferedReader(fluxo, BLOCO_BASE64) if not hasattr(fluxo, 'peek') else fluxo
+    if fluxo.peek(len(ASSINATURA_GZIP))[:len(ASSINATURA_GZIP)] == ASSINATURA_GZIP:
+        return gzip.GzipFile(fileobj=fluxo, mode='rb')
+    return fluxo
+
+
+# Chave (sha256 do CSV descomprimido) de um fluxo, sem processar as linhas
+def hash_fluxo(fluxo):
+    fluxo, resumo = _descomprimir(fluxo), hashlib.sha256()
+    while bloco := fluxo.read(BLOCO_BASE64):
+        resumo.update(bloco)
+    return resumo.hexdigest()
+
+
+# Importa um CSV recebido como fluxo de bytes (o corpo de uma requisição
+# HTTP), puro ou comprimido com gzip. A chave é o sha256 do CSV descomprimido,
+# a mesma de hash_envio para o mesmo CSV enviado pelo dcc.Upload. O CSV
+# descomprimido é limitado a LIMITE_DESCOMPRIMIDO_MB (ArquivoGrandeDemais).
+# Retorna a chave e o dataset.
+def ler_fluxo(fluxo, progresso=None, processos=PROCESSOS):
+    leitor = LeitorComHash(LeitorLimitado(_descomprimir(fluxo), int(LIMITE_DESCOMPRIMIDO_MB * 1024 * 1024)))
+    dataset = ler_csv(io.BufferedReader(leitor, BLOCO_BASE64), progresso, processos)
+    # Consome o que o parser eventualmente não tenha lido, para o hash cobrir o arquivo inteiro
+    while leitor.read(BLOCO_BASE64):
+        pass
+    return leitor.resumo.hexdigest(), dataset
+
+
+# Colunas de nomes armazenadas como categóricas (códigos inteiros + dicionário)
+COLUNAS_CATEGORICAS = ['MADEIRA_NOME', 'APRESENTACAO_NOME']
+
+
+# Converte as colunas de nomes em categóricas. O dicionário (coluna -> nomes)
+# recebe os nomes novos na ordem em que aparecem, então os códigos já
+# atribuídos não mudam entre blocos e as categorias seguem a ordem de unique().
+def codificar(df, dicionario):
+    colunas = {}
+    for coluna in COLUNAS_CATEGORICAS:
+        categorias = dicionario.get(coluna, pd.Index([], dtype=object))
+        nomes = pd.Index(df[coluna].dropna().unique())
+        dicionario[coluna] = categorias = categorias.append(nomes[~nomes.isin(categorias)])
+        colunas[coluna] = pd.Categorical(df[coluna], categories=categorias)
+    return df.assign(**colunas)
+
+
+# Aplica o dicionário final a todas as partes, para que possam ser concatenadas
+def _unificar(partes, dicionario):
+    return [parte.assign(**{coluna: parte[coluna].cat.set_categories(dicionario[coluna])
+                            for coluna in COLUNAS_CATEGORICAS})
+            for parte in partes]
+
+
+# Contexto dos processos do pool: a partir de um servidor de fork
+# (forkserver) de uma só thread. A importação roda em processos do gunicorn
+# com várias threads, e um fork direto copiaria locks mantidos por elas.
+_CONTEXTO = (multiprocessing.get_context('forkserver')
+             if 'forkserver' in multiprocessing.get_all_start_methods() else None)
+
+
+# Aplica `preparar` aos blocos, em ordem. Com mais de um processo e mais de um
+# bloco os blocos são distribuídos em um pool (no máximo dois por processo
+# aguardando, para limitar a memória) e os resultados são consumidos na ordem
+# de leitura, de modo que o dataset final não depende de qual processo
+# terminou primeiro. Os primeiros blocos são lidos antes de criar o pool, que
+# não tem mais processos que blocos.
+def _preparar_blocos(blocos, processos):
+    blocos = iter(blocos)
+    iniciais = list(itertools.islice(blocos, max(processos, 1)))
+    if processos <= 1 or len(iniciais) <= 1:
+        for bloco in itertools.chain(iniciais, blocos):
+            yield (len(bloco), *preparar(bloco))
+        return
+    processos = min(processos, len(iniciais))
+    with ProcessPoolExecutor(processos, mp_context=_CONTEXTO) as pool:
+        pendentes = deque()
+        for bloco in itertools.chain(iniciais, blocos):
+            pendentes.append((len(bloco), pool.submit(preparar, bloco)))
+            if len(pendentes) >= 2 * processos:
+                linhas, tarefa = pendentes.popleft()
+                yield (linhas, *tarefa.result())
+        while pendentes:
+            linhas, tarefa = pendentes.popleft()
+            yield (linhas, *tarefa.result())
+
+
+# Blocos do CSV, com as colunas verificadas no primeiro
+def _blocos_csv(fluxo):
+    for indice, bloco in enumerate(pd.read_csv(fluxo, chunksize=LINHAS_POR_BLOCO)):
+        if indice == 0:
+            verificar_colunas(bloco.columns)
+        yield bloco
+
+
+# Lê o CSV em blocos de LINHAS_POR_BLOCO linhas, convertendo NUMEROS/PROFUNDIDADE
+# e separando volume e área em cada bloco. Os cubos de agregação também são
+# calculados por bloco e combinados ao final; os preços robustos por espécie e
+# apresentação são calculados uma vez sobre o dataset completo. Volume e área têm dicionários de
+# nomes próprios. `progresso` recebe o total de linhas lidas.
+def ler_csv(fluxo, progresso=None, processos=PROCESSOS):
+    partes = {'df_vol': [], 'df_area': [], 'cubo_vol': [], 'cubo_area': []}
+    dicionarios = {'vol': {}, 'area': {}}
+    linhas = 0
+    for linhas_bloco, vol, area in _preparar_blocos(_blocos_csv(fluxo), processos):
+        for sufixo, df in (('vol', vol), ('area', area)):
+            df = codificar(df, dicionarios[sufixo])
+            partes[f'df_{sufixo}'].append(df)
+            partes[f'cubo_{sufixo}'].append(agregados.construir_cubo(df))
+        linhas += linhas_bloco
+        if progresso is not None:
+            progresso(linhas)
+    if not linhas:
+        raise ValueError('Arquivo CSV sem linhas de dados')
+    dataset = {}
+    for sufixo, dicionario in dicionarios.items():
+        dataset[f'df_{sufixo}'] = pd.concat(_unificar(partes[f'df_{sufixo}'], dicionario), ignore_index=True)
+        dataset[f'cubo_{sufixo}'] = agregados.combinar_cubos(_unificar(partes[f'cubo_{sufixo}'], dicionario))
+        dataset[f'precos_{sufixo}'] = agregados.precos_robustos(dataset[f'df_{sufixo}'])
+    return dataset
+
+
+# Arquivos enviados pelo dcc.Upload aguardando a tarefa de importação. O
+# callback que recebe o upload grava o CSV decodificado aqui e a tarefa em
+# segundo plano recebe só o nome do envio (hash do conteúdo e um sufixo
+# aleatório), em vez do conteúdo em base64, que o navegador reenviaria a cada
+# consulta do andamento da tarefa.
+ENVIOS_PATH = armazenamento.CACHE_PATH.joinpath('envios')
+# Envios mais antigos que isso (em segundos), de tarefas que nunca rodaram, são apagados
+VALIDADE_ENVIO = 24 * 60 * 60
+_ENVIO = re.compile(r'([0-9a-f]{64})-[0-9a-f]{16}')
+
+
+def _caminho_envio(envio):
+    if not isinstance(envio, str) or not _ENVIO.fullmatch(envio):
+        raise ValueError(f'Envio inválido: {envio!r}')
+    return ENVIOS_PATH.joinpath(f'{envio}.csv')
+
+
+def _limpar_envios():
+    limite = time.time() - VALIDADE_ENVIO
+    for arquivo in ENVIOS_PATH.glob('*.csv'):
+        try:
+            if arquivo.stat().st_mtime < limite:
+                arquivo.unlink()
+        except FileNotFoundError:
+            continue
+
+
+# Grava o conteúdo do dcc.Upload decodificado, em blocos, e retorna o nome do envio
+def guardar_upload(conteudo):
+    ENVIOS_PATH.mkdir(parents=True, exist_ok=True)
+    _limpar_envios()
+    sufixo = secrets.token_hex(8)
+    temporario = ENVIOS_PATH.joinpath(f'.{sufixo}.tmp')
+    resumo = hashlib.sha256()
+    with open(temporario, 'wb') as arquivo:
+        for bloco in _blocos_base64(conteudo):
+            resumo.update(bloco)
+            arquivo.write(bloco)
+    envio = f'{resumo.hexdigest()}-{sufixo}'
+    os.replace(temporario, _caminho_envio(envio))
+    return envio
+
+
+# Hash sha256 do conteúdo do envio, usado como chave do dataset
+def hash_envio(envio):
+    combinacao = _ENVIO.fullmatch(envio) if isinstance(envio, str) else None
+    return combinacao.group(1) if combinacao else None
+
+
+def ler_envio(envio, progresso=None):
+    with open(_caminho_envio(envio), 'rb') as arquivo:
+        return ler_csv(arquivo, progresso)
+
+
+def remover_envio(envio):
+    _caminho_envio(envio).unlink(missing_ok=True)
+
+
+# Chave de cada linha para a deduplicação: hash do conteúdo combinado com o
+# número da ocorrência, para que linhas repetidas dentro de um mesmo arquivo
+# (vendas iguais no mesmo dia) não sejam confundidas com reenvios
+def _chaves_linhas(df, colunas):
+    hashes = pd.util.hash_pandas_object(df[colunas], index=False).to_numpy()
+    ocorrencia = pd.Series(hashes).groupby(hashes).cumcount().to_numpy(dtype=np.uint64)
+    return hashes ^ (ocorrencia * np.uint64(0x9E3779B97F4A7C15))
+
+
+# Remove do incremento as linhas já presentes no dataset. Apenas as linhas
+# existentes dentro do intervalo de SK_DATA do incremento são comparadas; um
+# arquivo só com períodos novos não tem sobreposição a verificar.
+def _sem_duplicadas(existente, incremento):
+    if incremento.empty or existente.empty:
+        return incremento
+    datas = existente['SK_DATA'].to_numpy()
+    sobreposto = existente[(datas >= incremento['SK_DATA'].min()) & (datas <= incremento['SK_DATA'].max())]
+    if sobreposto.empty:
+        return incremento
+    colunas = sorted(set(existente.columns) & set(incremento.columns))
+    repetida = np.isin(_chaves_linhas(incremento, colunas), _chaves_linhas(sobreposto, colunas))
+    return incremento[~repetida]
+
+
+# Acrescenta ao dataset um dataset novo (outro CSV lido por ler_csv). Os nomes
+# novos entram no fim das categorias, sem mudar os códigos existentes, e os
+# cubos são atualizados somando apenas o cubo das linhas acrescentadas.
+# Medianas e quantis não se combinam por soma, então os preços robustos dos
+# grupos (espécie, apresentação) com linhas novas são recalculados sobre todas
+# as linhas desses grupos; os dos demais grupos são mantidos.
+# Retorna o dataset combinado e a quantidade de linhas duplicadas ignoradas.
+def acrescentar(dataset, novo):
+    combinado, duplicadas = {}, 0
+    for sufixo in ('vol', 'area'):
+        existente = dataset[f'df_{sufixo}']
+        incremento = _sem_duplicadas(existente, novo[f'df_{sufixo}'])
+        duplicadas += len(novo[f'df_{sufixo}']) - len(incremento)
+        dicionario = {coluna: existente[coluna].cat.categories for coluna in COLUNAS_CATEGORICAS}
+        incremento = codificar(incremento.astype({coluna: object for coluna in COLUNAS_CATEGORICAS}), dicionario)
+        existente, cubo_existente = _unificar([existente, dataset[f'cubo_{sufixo}']], dicionario)
+        combinado[f'df_{sufixo}'] = pd.concat([existente, incremento], ignore_index=True)
+        combinado[f'cubo_{sufixo}'] = agregados.combinar_cubos([cubo_existente, agregados.construir_cubo(incremento)])
+        precos = dataset.get(f'precos_{sufixo}')
+        combinado[f'precos_{sufixo}'] = (agregados.precos_robustos(combinado[f'df_{sufixo}']) if precos is None else
+                                         agregados.atualizar_precos_robustos(precos, combinado[f'df_{sufixo}'],
+                                                                             incremento))
+    return combinado, duplicadas
+
+
+# Intervalo de datas (SK_DATA) coberto pelo dataset
+def periodo(dataset):
+    datas = pd.concat([dataset['df_vol']['SK_DATA'], dataset['df_area']['SK_DATA']])
+    return datas.min(), datas.max()
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+# Cálculo do VOLUME (m³) ou da área (m²) a partir das medidas extraídas da
+# descrição (colunas N1..N3 e PROF1 de ingestao.parse_numeros), para CSVs que
+# não trazem a coluna VOLUME. Sem unidade explícita as medidas seguem o padrão
+# cm x cm x m; a profundidade, quando informada à parte, é o comprimento em m.
+# As duas menores medidas (espessura e largura) precisam estar em alguma das
+# faixas da NBR 14807; caso contrário o VOLUME fica indefinido (NaN).
+
+# Faixas de espessura e largura (cm) das peças de madeira serrada da NBR 14807
+NBR_14807 = pd.DataFrame([
+    ('pranchão', 7.0, np.inf, 20.0, np.inf),
+    ('prancha', 4.0, 7.0, 20.0, np.inf),
+    ('viga', 4.0, np.inf, 11.0, 20.0),
+    ('vigota', 4.0, 8.0, 8.0, 11.0),
+    ('caibro', 4.0, 8.0, 5.0, 8.0),
+    ('tábua', 1.0, 4.0, 10.0, np.inf),
+    ('sarrafo', 2.0, 4.0, 2.0, 10.0),
+    ('ripa', 0.0, 2.0, 0.0, 10.0),
+], columns=['PECA', 'ESPESSURA_MIN', 'ESPESSURA_MAX', 'LARGURA_MIN', 'LARGURA_MAX'])
+
+
+# Máscara das peças cuja espessura e largura estão em alguma faixa da tabela
+def dentro_da_norma(espessura, largura, tabela=NBR_14807):
+    valido = np.zeros(len(espessura), dtype=bool)
+    for faixa in tabela.itertuples():
+        valido |= ((espessura >= faixa.ESPESSURA_MIN) & (espessura <= faixa.ESPESSURA_MAX)
+                   & (largura >= faixa.LARGURA_MIN) & (largura <= faixa.LARGURA_MAX))
+    return valido
+
+
+# Calcula VOLUME para todas as linhas de uma vez: com três medidas (ou duas e
+# a profundidade) o volume em m³; com apenas duas, a área em m²
+def calcular_volume(df):
+    n1, n2, n3, prof1 = (df[coluna].to_numpy(dtype=np.float64) for coluna in ['N1', 'N2', 'N3', 'PROF1'])
+    n_count, prof_count = df['N_COUNT'].to_numpy(), df['PROF_COUNT'].to_numpy()
+    menor, maior = np.fmin(n1, n2), np.fmax(n1, n2)
+    # Comprimento convertido para cm, para ordenar junto com espessura e largura
+    comprimento = np.where(n_count > 2, n3 * 100, np.where(prof_count > 0, prof1 * 100, np.nan))
+    tem_comprimento = ~np.isnan(comprimento)
+    espessura = np.fmin(menor, comprimento)
+    largura = np.where(comprimento < menor, menor, np.fmin(maior, comprimento))
+    comprimento = np.fmax(maior, comprimento)
+    volume = np.where(tem_comprimento, espessura * largura * comprimento / 1_000_000, espessura * largura / 10_000)
+    valido = (n_count >= 2) & dentro_da_norma(espessura, largura)
+    return df.assign(VOLUME=np.where(valido, volume, np.nan))
@@ -0,0 +1,137 @@
+import logging
+import os
+import threading
+import time
+
+import flask
+
+# Métricas dos callbacks de servidor. Todos os callbacks chegam ao Flask pela
+# rota /_dash-update-component, identificados pelo campo 'output' do corpo da
+# requisição; medir nessa rota cobre cada @app.callback de index.py e das
+# páginas sem alterar os decoradores. Para callbacks em segundo plano, cada
+# requisição de início e de acompanhamento da tarefa é medida separadamente.
+
+ROTA = '/_dash-update-component'
+# Limites superiores (em segundos) das faixas do histograma de latência
+FAIXAS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+# Callbacks mais lentos que o limite (em milissegundos) são registrados no log
+LIMITE_LENTO_MS = float(os.environ.get('MADEIRA_CALLBACK_LENTO_MS', 1000))
+# Tamanho máximo de cada valor de entrada escrito no log (o conteúdo do upload
+# em base64 pode ter centenas de megabytes)
+TAMANHO_LOG = 200
+
+logger = logging.getLogger(__name__)
+
+_callbacks = {}
+# Importações pela API (rota POST /importar/csv)
+_importacoes = {'chamadas': 0, 'linhas': 0, 'bytes': 0, 'segundos': 0.0}
+_lock = threading.Lock()
+
+
+def _novo():
+    return {'faixas': [0] * len(FAIXAS), 'soma': 0.0, 'chamadas': 0, 'erros': 0,
+            'bytes_entrada': 0, 'bytes_saida': 0}
+
+
+def registrar(callback, segundos, bytes_entrada, bytes_saida, erro):
+    with _lock:
+        metricas = _callbacks.setdefault(callback, _novo())
+        for indice, limite in enumerate(FAIXAS):
+            if segundos <= limite:
+                metricas['faixas'][indice] += 1
+        metricas['soma'] += segundos
+        metricas['chamadas'] += 1
+        metricas['erros'] += erro
+        metricas['bytes_entrada'] += bytes_entrada
+        metricas['bytes_saida'] += bytes_saida
+
+
+def registrar_importacao(linhas, bytes_recebidos, segundos):
+    with _lock:
+        _importacoes['chamadas'] += 1
+        _importacoes['linhas'] += linhas
+        _importacoes['bytes'] += bytes_recebidos
+        _importacoes['segundos'] += segundos
+    logger.info('Importação de %d linhas (%d bytes) em %.2f s: %.0f linhas/s',
+                linhas, bytes_recebidos, segundos, linhas / segundos if segundos else 0)
+
+
+def _resumir(valor):
+    texto = repr(valor)
+    return texto if len(texto) <= TAMANHO_LOG else texto[:TAMANHO_LOG] + f'... ({len(texto)} caracteres)'
+
+
+def _entradas(corpo):
+    return {f"{entrada.get('id')}.{entrada.get('property')}": _resumir(entrada.get('value'))
+            for entrada in corpo.get('inputs', []) if isinstance(entrada, dict)}
+
+
+def _antes():
+    if flask.request.path.endswith(ROTA):
+        flask.g.inicio_callback = time.perf_counter()
+
+
+def _depois(resposta):
+    inicio = flask.g.pop('inicio_callback', None)
+    if inicio is None:
+        return resposta
+    segundos = time.perf_counter() - inicio
+    corpo = flask.request.get_json(silent=True) or {}
+    callback = corpo.get('output', 'desconhecido')
+    bytes_saida = resposta.content_length
+    if bytes_saida is None:
+        bytes_saida = 0 if resposta.is_streamed else len(resposta.get_data())
+    # 204 é o PreventUpdate/no_update do Dash; apenas respostas 5xx são erros
+    erro = resposta.status_code >= 500
+    registrar(callback, segundos, flask.request.content_length or 0, bytes_saida, erro)
+    if segundos * 1000 > LIMITE_LENTO_MS:
+        logger.warning('Callback lento: %s levou %.0f ms (disparado por %s, entradas %s)',
+                       callback, segundos * 1000, corpo.get('changedPropIds'), _entradas(corpo))
+    return resposta
+
+
+# Registra a medição nas requisições de callback do servidor Flask do app
+def instrumentar(server):
+    server.before_request(_antes)
+    server.after_request(_depois)
+
+
+def _rotulo(callback):
+    return callback.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Métricas no formato texto do Prometheus
+def exportar():
+    with _lock:
+        callbacks = {callback: dict(metricas, faixas=list(metricas['faixas']))
+                     for callback, metricas in _callbacks.items()}
+        importacoes = dict(_importacoes)
+    linhas = [
+        '# HELP madeira_callback_duracao_segundos Latência dos callbacks do Dash.',
+        '# TYPE madeira_callback_duracao_segundos histogram',
+    ]
+    for callback, metricas in sorted(callbacks.items()):
+        rotulo = _rotulo(callback)
+        for limite, quantidade in zip(FAIXAS, metricas['faixas']):
+            linhas.append(f'madeira_callback_duracao_segundos_bucket{{callback="{rotulo}",le="{limite}"}} {quantidade}')
+        linhas.append(f'madeira_callback_duracao_segundos_bucket{{callback="{rotulo}",le="+Inf"}} {metricas["chamadas"]}')
+        linhas.append(f'madeira_callback_duracao_segundos_sum{{callback="{rotulo}"}} {metricas["soma"]}')
+        linhas.append(f'madeira_callback_duracao_segundos_count{{callback="{rotulo}"}} {metricas["chamadas"]}')
+    for nome, campo, descricao in [
+        ('madeira_callback_bytes_entrada_total', 'bytes_entrada', 'Bytes recebidos nas requisições dos callbacks.'),
+        ('madeira_callback_bytes_saida_total', 'bytes_saida', 'Bytes devolvidos pelos callbacks.'),
+        ('madeira_callback_erros_total', 'erros', 'Callbacks que terminaram com erro.'),
+    ]:
+        linhas.append(f'# HELP {nome} {descricao}')
+        linhas.append(f'# TYPE {nome} counter')
+        for callback, metricas in sorted(callbacks.items()):
+            linhas.append(f'{nome}{{callback="{_rotulo(callback)}"}} {metricas[campo]}')
+    # Vazão da importação: linhas_total / segundos_total
+    for nome, campo, descricao in [
+        ('madeira_importacao_total', 'chamadas', 'Arquivos importados pela API.'),
+        ('madeira_importacao_linhas_total', 'linhas', 'Linhas de CSV importadas pela API.'),
+        ('madeira_importacao_bytes_total', 'bytes', 'Bytes recebidos pela API de importação.'),
+        ('madeira_importacao_segundos_total', 'segundos', 'Tempo gasto nas importações pela API.'),
+    ]:
+        linhas += [f'# HELP {nome} {descricao}', f'# TYPE {nome} counter', f'{nome} {importacoes[campo]}']
+    return '\n'.join(linhas) + '\n'
@@ -0,0 +1,119 @@
+import gc
+import logging
+from concurrent.futures import BrokenExecutor
+import os
+import pathlib
+import threading
+import time
+
+import ingestao
+import registro
+
+# Dataset padrão: o CSV (ou CSV.gz) mais recente da pasta datasets/, aberto
+# nas sessões que ainda não importaram um arquivo. É carregado na
+# inicialização do servidor; com o gunicorn --preload isso acontece no
+# processo principal, antes do fork, e os processos de trabalho compartilham
+# os DataFrames por copy-on-write. Um arquivo já importado antes é reaberto do
+# armazenamento local (memory map) sem processar as linhas de novo.
+PATH = pathlib.Path(__file__).parent
+DATASETS_PATH = pathlib.Path(os.environ.get('MADEIRA_DATASETS_DIR', PATH.joinpath('../datasets'))).resolve()
+# Intervalo (em segundos) entre as verificações de arquivo novo na pasta;
+# 0 desativa a verificação automática (resta a rota de recarga)
+INTERVALO = float(os.environ.get('MADEIRA_DATASETS_INTERVALO', 60))
+EXTENSOES = ('.csv', '.csv.gz')
+
+logger = logging.getLogger(__name__)
+
+_estado = {'arquivo': None, 'assinatura': None, 'chave': None, 'verificado': 0.0, 'verificando': False}
+_lock_estado = threading.Lock()
+# Uma carga por vez em cada processo
+_lock_carga = threading.Lock()
+
+
+def _mais_recente():
+    if not DATASETS_PATH.is_dir():
+        return None
+    arquivos = [arquivo for arquivo in DATASETS_PATH.iterdir()
+                if arquivo.is_file() and arquivo.name.lower().endswith(EXTENSOES)]
+    return max(arquivos, key=lambda arquivo: arquivo.stat().st_mtime_ns, default=None)
+
+
+# Carrega o arquivo mais recente da pasta, se mudou desde a última carga (ou
+# sempre, com forcar=True), e retorna a chave do dataset padrão. `processos`
+# é repassado a ingestao.ler_csv.
+def carregar(forcar=False, processos=ingestao.PROCESSOS):
+    with _lock_carga:
+        arquivo = _mais_recente()
+        if arquivo is None:
+            with _lock_estado:
+                _estado.update(arquivo=None, assinatura=None, chave=None, verificado=time.monotonic())
+            return None
+        informacoes = arquivo.stat()
+        assinatura = (str(arquivo), informacoes.st_mtime_ns, informacoes.st_size)
+        if not forcar and assinatura == _estado['assinatura']:
+            with _lock_estado:
+                _estado['verificado'] = time.monotonic()
+            return _estado['chave']
+        inicio = time.perf_counter()
+        with open(arquivo, 'rb') as fluxo:
+            chave = ingestao.hash_fluxo(fluxo)
+        # Outro processo (ou uma execução anterior) pode já ter gravado o dataset
+        if registro.obter_dataset(chave) is None:
+            with open(arquivo, 'rb') as fluxo:
+                chave, dataset = ingestao.ler_fluxo(fluxo, processos=processos)
+            registro.registrar(chave, dataset)
+        with _lock_estado:
+            _estado.update(arquivo=arquivo.name, assinatura=assinatura, chave=chave, verificado=time.monotonic())
+        logger.info('Dataset padrão %s (%s) carregado em %.2f s', arquivo.name, chave, time.perf_counter() - inicio)
+        return chave
+
+
+def _verificar():
+    try:
+        carregar()
+    except (ValueError, OSError, EOFError):
+        logger.exception('Falha ao carregar o dataset padrão de %s', DATASETS_PATH)
+    finally:
+        with _lock_estado:
+            _estado['verificando'] = False
+
+
+# Chave do dataset padrão (None se a pasta não tiver arquivos). A cada
+# INTERVALO segundos a pasta é verificada em segundo plano; até a carga de um
+# arquivo novo terminar, a chave anterior continua valendo.
+def chave():
+    with _lock_estado:
+        iniciar = (INTERVALO > 0 and not _estado['verificando']
+                   and time.monotonic() - _estado['verificado'] > INTERVALO)
+        if iniciar:
+            _estado['verificando'] = True
+            _estado['verificado'] = time.monotonic()
+        atual = _estado['chave']
+    if iniciar:
+        threading.Thread(target=_verificar, daemon=True).start()
+    return atual
+
+
+def estado():
+    chave()
+    with _lock_estado:
+        return {'pasta': str(DATASETS_PATH), 'arquivo': _estado['arquivo'], 'dataset': _estado['chave']}
+
+
+# Carga na inicialização do servidor. Um arquivo inválido não impede o
+# servidor de subir. Os blocos são preparados no próprio processo, sem o pool
+# de ingestao: a carga roda durante o import do app, e um pool iniciado ali
+# falha quando o import acontece dentro de um processo do multiprocessing
+# (o servidor de fork importa o __main__ antes de iniciar os processos). Os
+# objetos carregados saem das varreduras do coletor de lixo (gc.freeze), que
+# de outra forma tocariam cada objeto nos processos de trabalho e desfariam o
+# compartilhamento das páginas de memória.
+def iniciar():
+    if _mais_recente() is None:
+        return None
+    try:
+        carregar(processos=1)
+    except (ValueError, OSError, EOFError, RuntimeError, BrokenExecutor):
+        logger.exception('Falha ao carregar o dataset padrão de %s', DATASETS_PATH)
+    gc.freeze()
+    return _estado['chave']
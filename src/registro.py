@@ -0,0 +1,101 @@
+import os
+import threading
+from collections import OrderedDict
+
+import armazenamento
+import sob_demanda
+
+# padrao importa este módulo; a referência é resolvida no primeiro uso
+padrao = sob_demanda.importar('padrao')
+
+# Registro dos datasets carregados no servidor.
+# O dcc.Store guarda apenas a chave (hash do conteúdo enviado) e as páginas
+# buscam os DataFrames aqui, evitando trafegar todas as linhas em JSON.
+# Datasets fora da memória (removidos pelo limite ou de antes de um restart)
+# são reabertos do armazenamento local em Arrow.
+
+# Limite de memória do registro (em MB), configurável pela variável de ambiente
+LIMITE_MB = float(os.environ.get('MADEIRA_REGISTRO_MB', 512))
+
+_datasets = OrderedDict()
+_tamanhos = {}
+_lock = threading.Lock()
+
+
+# Estima a memória ocupada pelos DataFrames de um dataset
+def _tamanho(dataset):
+    return sum(int(df.memory_usage(deep=True).sum()) for df in dataset.values())
+
+
+# Remove os datasets usados há mais tempo até caber no limite,
+# mantendo sempre o mais recente
+def _liberar_memoria():
+    limite = LIMITE_MB * 1024 * 1024
+    while len(_datasets) > 1 and sum(_tamanhos.values()) > limite:
+        chave, _ = _datasets.popitem(last=False)
+        del _tamanhos[chave]
+
+
+def _guardar(chave, dataset):
+    with _lock:
+        _datasets[chave] = dataset
+        _datasets.move_to_end(chave)
+        _tamanhos[chave] = _tamanho(dataset)
+        _liberar_memoria()
+
+
+def registrar(chave, dataset):
+    armazenamento.salvar(chave, dataset)
+    _guardar(chave, dataset)
+    # Os datasets em memória e o dataset padrão nunca saem do disco
+    with _lock:
+        manter = set(_datasets)
+    manter.add(padrao.chave())
+    armazenamento.liberar_espaco(manter)
+    return {'dataset': chave}
+
+
+# Retorna o dataset da chave, da memória ou do armazenamento local
+def obter_dataset(chave):
+    with _lock:
+        dataset = _datasets.get(chave)
+        if dataset is not None:
+            _datasets.move_to_end(chave)
+            return dataset
+    dataset = armazenamento.carregar(chave)
+    if dataset is not None:
+        _guardar(chave, dataset)
+    return dataset
+
+
+# Conteúdo do dcc.Store das sessões que usam o dataset padrão. O Store guarda
+# o marcador, e não a chave do padrão, para que a troca do arquivo na pasta
+# datasets/ chegue também aos navegadores que já abriram o painel.
+PADRAO = {'padrao': True}
+
+
+# Se a chave é de um dataset registrado (na memória ou no armazenamento local)
+def existe(chave):
+    try:
+        return chave is not None and obter_dataset(chave) is not None
+    except ValueError:
+        return False
+
+
+# Chave do dataset de uma sessão a partir do conteúdo do dcc.Store: a chave
+# guardada, se o dataset existe, ou a do dataset padrão para sessões com o
+# marcador PADRAO, sem dataset importado ou com um que não existe mais
+def resolver(stored_data):
+    chave = (stored_data or {}).get('dataset')
+    if existe(chave):
+        return chave
+    return padrao.chave()
+
+
+# Retorna o DataFrame `nome` ('df_vol' ou 'df_area') a partir do conteúdo do dcc.Store
+def obter(stored_data, nome):
+    chave = resolver(stored_data)
+    dataset = obter_dataset(chave) if chave else None
+    if dataset is None:
+        return None
+    return dataset.get(nome)
@@ -0,0 +1,88 @@
+import base64
+import json
+import os
+
+import sob_demanda
+
+np = sob_demanda.importar('numpy')
+
+# Serialização compacta das figuras: os vetores numéricos dos traços (x, y,
+# values, ...) são enviados como arrays tipados do plotly.js
+# ({'dtype': 'f8', 'bdata': <base64>}) quando isso ocupa menos que a lista
+# JSON de números, que gasta até 24 caracteres por valor em float64 (médias de
+# preço, séries diárias); valores curtos (somas redondas) continuam em lista.
+
+# Vetores menores que isso continuam como lista (o ganho não compensa)
+TAMANHO_MINIMO = 8
+# Limite opcional de precisão: MADEIRA_FIGURAS_DIGITOS=n arredonda os valores
+# decimais para n dígitos significativos; com n <= 7 os arrays tipados usam
+# float32 (metade dos bytes)
+DIGITOS = int(os.environ.get('MADEIRA_FIGURAS_DIGITOS', 0)) or None
+
+_TIPOS_INTEIROS = [('i1', 'int8'), ('i2', 'int16'), ('i4', 'int32')]
+
+
+def _array_tipado(valores):
+    if not isinstance(valores, (np.ndarray, list, tuple)) or len(valores) < TAMANHO_MINIMO:
+        return None
+    try:
+        vetor = np.asarray(valores)
+    except ValueError:
+        return None
+    if vetor.ndim != 1 or vetor.dtype.kind not in 'biuf':
+        return None
+    if vetor.dtype.kind == 'f':
+        vetor = vetor.astype('<f8') if DIGITOS is None else arredondar(vetor, DIGITOS)
+        # JSON com null no lugar de NaN
+        lista = np.where(np.isnan(vetor), None, vetor).tolist()
+        tipo, tipado = ('f4', vetor.astype('<f4')) if DIGITOS and DIGITOS <= 7 else ('f8', vetor)
+    else:
+        lista = vetor.tolist()
+        # Inteiros no menor tipo que comporta os valores (plotly.js não aceita int64)
+        minimo, maximo = int(vetor.min()), int(vetor.max())
+        tipo = next((codigo for codigo, numpy_tipo in _TIPOS_INTEIROS
+                     if np.iinfo(numpy_tipo).min <= minimo and maximo <= np.iinfo(numpy_tipo).max), 'f8')
+        tipado = vetor.astype('<' + tipo)
+    bdata = base64.b64encode(tipado.tobytes()).decode('ascii')
+    # Fica a menor das duas representações
+    if len(bdata) + 30 < len(json.dumps(lista)):
+        return {'dtype': tipo, 'bdata': bdata}
+    return lista if DIGITOS and vetor.dtype.kind == 'f' else None
+
+
+# Arredonda para `digitos` dígitos significativos
+def arredondar(vetor, digitos):
+    vetor = np.asarray(vetor, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        magnitude = np.floor(np.log10(np.abs(vetor)))
+    fator = 10.0 ** np.where(np.isfinite(magnitude), digitos - 1 - magnitude, 0)
+    return np.round(vetor * fator) / fator
+
+
+# Converte os vetores numéricos dos traços de uma figura (em dicionário) para
+# arrays tipados (ou listas arredondadas, com o limite de precisão). Rótulos de
+# texto e o layout não mudam.
+def compactar(figura):
+    if not isinstance(figura, dict) or not figura.get('data'):
+        return figura
+    tracos = []
+    for traco in figura['data']:
+        traco = dict(traco)
+        for atributo, valores in traco.items():
+            tipado = _array_tipado(valores)
+            if tipado is not None:
+                traco[atributo] = tipado
+        tracos.append(traco)
+    return dict(figura, data=tracos)
+
+
+# Operação inversa de compactar, para comparar figuras e medir o ganho
+def expandir(figura):
+    if not isinstance(figura, dict) or not figura.get('data'):
+        return figura
+    tracos = []
+    for traco in figura['data']:
+        tracos.append({atributo: np.frombuffer(base64.b64decode(valor['bdata']), dtype='<' + valor['dtype'])
+                       if isinstance(valor, dict) and 'bdata' in valor else valor
+                       for atributo, valor in traco.items()})
+    return dict(figura, data=tracos)
@@ -0,0 +1,38 @@
+import importlib
+import threading
+
+# Importação sob demanda das bibliotecas pesadas (pandas, numpy, pyarrow,
+# plotly.express, xlsxwriter). O processo do servidor sobe só com o Dash e o
+# Flask; cada biblioteca é importada no primeiro acesso a um atributo, na
+# primeira navegação ou importação de dados que precisa dela. As páginas e os
+# callbacks continuam registrados na inicialização.
+
+
+class Modulo:
+    def __init__(self, nome):
+        self._nome = nome
+        self._modulo = None
+        self._lock = threading.Lock()
+
+    def carregar(self):
+        if self._modulo is None:
+            with self._lock:
+                if self._modulo is None:
+                    self._modulo = importlib.import_module(self._nome)
+        return self._modulo
+
+    def __getattr__(self, atributo):
+        return getattr(self.carregar(), atributo)
+
+    def __repr__(self):
+        estado = 'carregado' if self._modulo is not None else 'não carregado'
+        return f'<módulo {self._nome} sob demanda ({estado})>'
+
+    # Nos processos de trabalho o módulo é importado novamente sob demanda
+    def __reduce__(self):
+        return Modulo, (self._nome,)
+
+
+# Uso: pd = sob_demanda.importar('pandas')
+def importar(nome):
+    return Modulo(nome)